@@ -0,0 +1,62 @@
+from io import BytesIO
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+try:
+    # Fotky z iPhonu chodí jako HEIC; Pillow ho bez pillow-heif neotevře
+    from pillow_heif import register_heif_opener
+except ImportError:
+    HEIF_SUPPORTED = False
+else:
+    register_heif_opener()
+    HEIF_SUPPORTED = True
+
+
+def open_image(fileobj):
+    """Načte obrázek celý do paměti a otočí ho podle EXIF orientace."""
+    image = Image.open(fileobj)
+    image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def flatten(image, background=(255, 255, 255)):
+    """Převede obrázek do RGB; průhledné oblasti vyplní barvou pozadí."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        flattened = Image.new('RGB', image.size, background)
+        flattened.paste(image, mask=image.getchannel('A'))
+        return flattened
+    return image.convert('RGB')
+
+
+def resize_to_fit(image, max_size):
+    """Zmenší obrázek (nikdy nezvětšuje) tak, aby se vešel do max_size se zachováním poměru stran."""
+    resized = image.copy()
+    resized.thumbnail(max_size, Image.LANCZOS)
+    return resized
+
+
+def resize_to_cover(image, min_size):
+    """Zmenší obrázek (nikdy nezvětšuje) tak, aby stále pokrýval celý min_size."""
+    width, height = image.size
+    scale = max(min_size[0] / width, min_size[1] / height)
+    if scale >= 1:
+        return image.copy()
+    return image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+
+def pad_to_size(image, size, background=(255, 255, 255)):
+    """Zmenší obrázek do `size` a doplní okraje barvou pozadí na přesný rozměr."""
+    return ImageOps.pad(image, size, method=Image.LANCZOS, color=background)
+
+
+def encode(image, format='WEBP', quality=82):
+    """Zakóduje obrázek bez metadat a vrátí ho jako ContentFile."""
+    buffer = BytesIO()
+    params = {'quality': quality}
+    if format == 'JPEG':
+        params.update(optimize=True, progressive=True)
+    elif format == 'WEBP':
+        params.update(method=6)
+    image.save(buffer, format=format, **params)
+    return ContentFile(buffer.getvalue())
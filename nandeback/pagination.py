@@ -0,0 +1,84 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination, jejíž pozice jsou hodnoty všech polí řazení včetně id
+    (WHERE (a, id) > (:a, :id)). Standardní cursor bere jen první pole a shody
+    přeskakuje offsetem omezeným na 1000, takže u více než 1000 produktů se
+    stejnou cenou nebo skóre se stránky zacyklí. Pole řazení nesmí být NULL.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(term.lstrip('-') in ('id', 'pk') for term in ordering):
+            ordering += ('id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        current_position = self.cursor.position if self.cursor else None
+
+        ordering = [term[1:] if term.startswith('-') else f'-{term}' for term in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._keyset_filter(self._decode_position(current_position), reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if len(results) > self.page_size else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _keyset_filter(self, values, reverse):
+        # (a > :a) OR (a = :a AND id > :id), se směrem podle každého pole
+        query = Q()
+        equal = Q()
+        for term, value in zip(self.ordering, values):
+            field = term.lstrip('-')
+            lookup = 'lt' if term.startswith('-') != reverse else 'gt'
+            query |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return query
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[term.lstrip('-')] if isinstance(instance, dict) else getattr(instance, term.lstrip('-'))
+            for term in ordering
+        ]
+        return json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'tryon',
     'storages',
     'django_filters',
+    'django_celery_results',
 ]
 
 AUTH_USER_MODEL = 'user.CustomUser'
@@ -59,7 +61,6 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -67,11 +68,19 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Zkompilované šablony se drží v paměti procesu
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'nandeback.wsgi.application'
+ASGI_APPLICATION = 'nandeback.asgi.application'
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
@@ -79,7 +88,9 @@ if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600,
+            # Pod ASGI dostane každý request vlastní vlákno, perzistentní spojení by se
+            # nikdy znovu nepoužilo a jen by se hromadila - výchozí 0 (zavřít po requestu)
+            conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 0)),
             conn_health_checks=True,
             ssl_require=True
         )
@@ -261,6 +272,99 @@ GOOGLE_PACKAGE_NAME = os.environ.get('GOOGLE_PACKAGE_NAME', 'com.nandezu.nandefr
 APPLE_WEBHOOK_URL = os.environ.get('APPLE_WEBHOOK_URL', 'https://app-tdh1.onrender.com/apple-webhook/')
 GOOGLE_WEBHOOK_URL = os.environ.get('GOOGLE_WEBHOOK_URL', 'https://app-tdh1.onrender.com/google-webhook/')
 
+# Replicate / virtual try-on
+REPLICATE_API_TOKEN = os.environ.get('REPLICATE_API_TOKEN')
+TRYON_MODEL_VERSION = os.environ.get(
+    'TRYON_MODEL_VERSION',
+    'cuuupid/idm-vton:906425dbca90663ff5427624839572cc56ea7d380343d13e2a4c4b09d3f0c30f'
+)
+# Vstupní rozlišení idm-vton (šířka, výška)
+TRYON_INPUT_SIZE = (768, 1024)
+# Server-sent events se stavem jobu (běží na ASGI workerech, stav čtou z cache)
+TRYON_EVENTS_POLL_INTERVAL = float(os.environ.get('TRYON_EVENTS_POLL_INTERVAL', 1))
+TRYON_EVENTS_MAX_DURATION = int(os.environ.get('TRYON_EVENTS_MAX_DURATION', 600))
+# Maximální velikost nahrávané profilové fotky
+PROFILE_IMAGE_MAX_UPLOAD_SIZE = int(os.environ.get('PROFILE_IMAGE_MAX_UPLOAD_SIZE', 20 * 1024 * 1024))
+# Platnost presigned URL pro přímý upload profilové fotky do S3 (sekundy)
+PROFILE_IMAGE_UPLOAD_URL_EXPIRY = int(os.environ.get('PROFILE_IMAGE_UPLOAD_URL_EXPIRY', 600))
+# Dávkové try-ony: max. počet produktů v dávce a souběžných predikcí
+TRYON_BATCH_MAX_ITEMS = int(os.environ.get('TRYON_BATCH_MAX_ITEMS', 10))
+TRYON_BATCH_CONCURRENCY = int(os.environ.get('TRYON_BATCH_CONCURRENCY', 4))
+# Ověřování dostupnosti vstupních obrázků před inferencí
+TRYON_PROBE_TIMEOUT = float(os.environ.get('TRYON_PROBE_TIMEOUT', 10))
+TRYON_PROBE_CACHE_TTL = int(os.environ.get('TRYON_PROBE_CACHE_TTL', 300))
+TRYON_PROBE_POOL_SIZE = int(os.environ.get('TRYON_PROBE_POOL_SIZE', 8))
+# Cache hotových výsledků (stejný oděv + stejná profilová fotka)
+TRYON_CACHE_MAX_AGE = int(os.environ.get('TRYON_CACHE_MAX_AGE', 60 * 60 * 24 * 30))
+TRYON_CACHE_MAX_ENTRIES = int(os.environ.get('TRYON_CACHE_MAX_ENTRIES', 50000))
+
+# Zrcadlení obrázků oděvů do našeho bucketu
+GARMENT_IMAGE_MAX_SIZE = int(os.environ.get('GARMENT_IMAGE_MAX_SIZE', 20 * 1024 * 1024))
+# Po jaké době se znovu ověří originál (podmíněný GET s ETagem) a kolik produktů za běh
+GARMENT_IMAGE_REVALIDATE_AGE = int(os.environ.get('GARMENT_IMAGE_REVALIDATE_AGE', 60 * 60 * 24 * 7))
+GARMENT_IMAGE_REVALIDATE_BATCH = int(os.environ.get('GARMENT_IMAGE_REVALIDATE_BATCH', 500))
+
+# Cache - Redis v produkci, jinak lokální paměť procesu
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cache katalogu produktů: verze katalogu a hotové odpovědi seznamu
+CATALOG_STATE_CACHE_TTL = int(os.environ.get('CATALOG_STATE_CACHE_TTL', 60))
+CATALOG_RESPONSE_CACHE_TTL = int(os.environ.get('CATALOG_RESPONSE_CACHE_TTL', 60 * 15))
+# Webový katalog (/catalog/): velikost stránky a Cache-Control pro prohlížeče a CDN
+CATALOG_PAGE_SIZE = int(os.environ.get('CATALOG_PAGE_SIZE', 48))
+CATALOG_PAGE_MAX_AGE = int(os.environ.get('CATALOG_PAGE_MAX_AGE', 60))
+CATALOG_PAGE_SHARED_MAX_AGE = int(os.environ.get('CATALOG_PAGE_SHARED_MAX_AGE', 60 * 10))
+# Cache id oblíbených produktů uživatele (zápis ji zneplatní zvýšením verze, načte se znovu z DB)
+FAVORITES_CACHE_TTL = int(os.environ.get('FAVORITES_CACHE_TTL', 60 * 60 * 24))
+# Jak dlouho se drží log změn oblíbených pro /favorites/sync/ (starší klient dostane celý seznam)
+FAVORITE_CHANGE_RETENTION = int(os.environ.get('FAVORITE_CHANGE_RETENTION', 60 * 60 * 24 * 30))
+
+# Popularita produktů (?ordering=popularity): váhy událostí pro trending_score,
+# poločas jeho vyhasínání a jak často úloha srovnává počítadla s DB
+POPULARITY_FAVORITE_WEIGHT = float(os.environ.get('POPULARITY_FAVORITE_WEIGHT', 1.0))
+POPULARITY_TRY_ON_WEIGHT = float(os.environ.get('POPULARITY_TRY_ON_WEIGHT', 3.0))
+POPULARITY_HALF_LIFE = int(os.environ.get('POPULARITY_HALF_LIFE', 60 * 60 * 24 * 7))
+POPULARITY_REFRESH_INTERVAL = int(os.environ.get('POPULARITY_REFRESH_INTERVAL', 60 * 60))
+POPULARITY_RECONCILE_BATCH = int(os.environ.get('POPULARITY_RECONCILE_BATCH', 5000))
+
+# Celery konfigurace
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL or 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = 'django-db'
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_BEAT_SCHEDULE = {
+    'evict-try-on-cache': {
+        'task': 'tryon.tasks.evict_try_on_cache',
+        'schedule': 60 * 60,
+    },
+    'revalidate-garment-images': {
+        'task': 'shop.tasks.revalidate_product_images',
+        'schedule': 60 * 60,
+    },
+    'refresh-product-popularity': {
+        'task': 'shop.tasks.refresh_product_popularity',
+        'schedule': POPULARITY_REFRESH_INTERVAL,
+    },
+    'prune-favorite-sync-log': {
+        'task': 'user.tasks.prune_favorite_sync_log',
+        'schedule': 60 * 60 * 24,
+    },
+}
+
 # Stripe configuration
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
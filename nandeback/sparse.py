@@ -0,0 +1,41 @@
+import copy
+from functools import lru_cache
+
+
+def requested_fields(query_params, available, compact=None):
+    """
+    Vrátí n-tici polí požadovaných přes ?fields=a,b (jen známá, v pořadí
+    serializeru), nebo `compact` pro ?compact=1. Bez parametrů vrací None.
+    """
+    if query_params.get('fields'):
+        wanted = {field.strip() for field in query_params['fields'].split(',')}
+        return tuple(field for field in available if field in wanted) or None
+    if compact and query_params.get('compact') in ('1', 'true'):
+        return tuple(compact)
+    return None
+
+
+@lru_cache(maxsize=128)
+def sparse_serializer(serializer_class, fields):
+    """Podtřída ModelSerializeru omezená na `fields`; třída se pro stejná pole vytváří jen jednou."""
+    meta = type('Meta', (serializer_class.Meta,), {'fields': list(fields)})
+    return type(serializer_class.__name__, (serializer_class,), {'Meta': meta})
+
+
+def model_field_names(model, fields):
+    """Pole serializeru, která jsou sloupci modelu - pro QuerySet.only()."""
+    concrete = {field.name for field in model._meta.concrete_fields}
+    return [field for field in fields if field in concrete]
+
+
+class CachedFieldsMixin:
+    """
+    ModelSerializer skládá pole introspekcí modelu při každé nové instanci.
+    Tady se složí jednou pro každou třídu a instance dostanou jen jejich kopii.
+    """
+
+    def get_fields(self):
+        cls = type(self)
+        if '_cached_fields' not in cls.__dict__:
+            cls._cached_fields = super().get_fields()
+        return copy.deepcopy(cls._cached_fields)
@@ -0,0 +1,91 @@
+import logging
+from functools import lru_cache
+from urllib.parse import unquote, urlparse
+import boto3
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_TIMEOUT = (5, 60)
+
+
+class RemoteFileError(Exception):
+    """Vzdálený soubor se nepodařilo stáhnout."""
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """Sdílený boto3 klient - drží pool spojení napříč requesty."""
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+    )
+
+
+def bucket_key_from_url(url):
+    """Vrátí klíč objektu, pokud URL míří do našeho bucketu, jinak None."""
+    parsed = urlparse(url)
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    if not bucket or parsed.scheme not in ('http', 'https'):
+        return None
+    if parsed.netloc in (settings.AWS_S3_CUSTOM_DOMAIN, f'{bucket}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com'):
+        key = parsed.path.lstrip('/')
+        return unquote(key) or None
+    return None
+
+
+def storage_name_from_url(url):
+    """Jméno souboru v default_storage pro URL z default_storage.url(), jinak None."""
+    key = bucket_key_from_url(url)
+    if key and _is_s3_storage():
+        location = getattr(default_storage, 'location', '').strip('/')
+        if not location:
+            return key
+        return key[len(location) + 1:] if key.startswith(f'{location}/') else None
+    base_url = getattr(default_storage, 'base_url', None)
+    if base_url and url.startswith(base_url):
+        return unquote(url[len(base_url):]) or None
+    return None
+
+
+def _storage_key(name):
+    location = getattr(default_storage, 'location', '')
+    return '/'.join(part.strip('/') for part in (location, name) if part)
+
+
+def _is_s3_storage():
+    return getattr(default_storage, 'bucket_name', None) == settings.AWS_STORAGE_BUCKET_NAME
+
+
+def copy_url_to_storage(url, name):
+    """
+    Uloží obsah URL do default_storage pod jménem `name` a vrátí skutečné jméno souboru.
+
+    Objekty z našeho bucketu se kopírují na straně S3 (CopyObject), ostatní URL
+    se streamují po částech přímo do multipart uploadu, takže se obrázek nikdy
+    nedrží celý v paměti workeru.
+    """
+    source_key = bucket_key_from_url(url)
+    if source_key and _is_s3_storage():
+        name = default_storage.get_available_name(name)
+        default_storage.connection.meta.client.copy_object(
+            Bucket=default_storage.bucket_name,
+            Key=_storage_key(name),
+            CopySource={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': source_key},
+        )
+        logger.info(f"Copied {source_key} to {name} server-side")
+        return name
+
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        if response.status_code != 200:
+            raise RemoteFileError(f"Download of {url} failed with status {response.status_code}")
+        response.raw.decode_content = True
+        name = default_storage.save(name, File(response.raw, name=name))
+    logger.info(f"Streamed {url} to {name}")
+    return name
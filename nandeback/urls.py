@@ -24,6 +24,7 @@ urlpatterns = [
     path('', include(router.urls)),
     path('user/', include('user.urls')),
     path('tryon/', include('tryon.urls')),
+    path('catalog/', include('shop.urls')),
     
     # Subscription related paths
     path('subscription/', include([
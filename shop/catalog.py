@@ -0,0 +1,57 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import CatalogState
+
+
+CATALOG_STATE_ID = 1
+STATE_CACHE_KEY = 'catalog:state'
+RESPONSE_CACHE_PREFIX = 'catalog:response:'
+
+
+def get_catalog_state():
+    """Aktuální verze katalogu; čte se z cache, do DB jde jen při miss."""
+    state = cache.get(STATE_CACHE_KEY)
+    if state is None:
+        state, _ = CatalogState.objects.get_or_create(pk=CATALOG_STATE_ID)
+        cache.set(STATE_CACHE_KEY, state, settings.CATALOG_STATE_CACHE_TTL)
+    return state
+
+
+def bump_catalog_version():
+    """Zvýší verzi katalogu; volá se po každém zápisu do Product."""
+    updated = CatalogState.objects.filter(pk=CATALOG_STATE_ID).update(version=F('version') + 1, updated_at=timezone.now())
+    if not updated:
+        CatalogState.objects.get_or_create(pk=CATALOG_STATE_ID, defaults={'version': 1})
+    # Mazat až po commitu, jinak by si souběžný request mohl nacachovat starou verzi
+    cache.delete(STATE_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(STATE_CACHE_KEY))
+
+
+def normalize_query(query_params):
+    """Seřazené parametry dotazu, aby ?a=1&b=2 a ?b=2&a=1 daly stejný klíč."""
+    return '&'.join(
+        f'{key}={value}'
+        for key in sorted(query_params)
+        for value in sorted(query_params.getlist(key))
+    )
+
+
+def catalog_etag(state, *parts):
+    raw = '\n'.join([str(state.version), *parts])
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest() + '"'
+
+
+# Klíč odpovědi je odvozený z ETagu, takže po změně verze katalogu staré
+# záznamy nikdo nečte a samy vyprší po CATALOG_RESPONSE_CACHE_TTL.
+
+
+def get_cached_response(etag):
+    return cache.get(RESPONSE_CACHE_PREFIX + etag.strip('"'))
+
+
+def cache_response(etag, data):
+    cache.set(RESPONSE_CACHE_PREFIX + etag.strip('"'), data, settings.CATALOG_RESPONSE_CACHE_TTL)
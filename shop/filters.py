@@ -0,0 +1,43 @@
+import django_filters
+from rest_framework.filters import OrderingFilter
+from .models import Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    price_min = django_filters.NumberFilter(field_name='price_amount', lookup_expr='gte')
+    price_max = django_filters.NumberFilter(field_name='price_amount', lookup_expr='lte')
+
+    class Meta:
+        model = Product
+        fields = {
+            'clothing_category': ['exact', 'in'],
+            'clothing_type': ['exact', 'in'],
+            'manufacturer_name': ['exact', 'in'],
+            'colour': ['exact', 'in'],
+            'price_currency': ['exact'],
+        }
+
+
+class CatalogOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter s veřejnými aliasy (?ordering=price -> price_amount,
+    ?ordering=popularity -> -trending_score).
+    Vždy přidá id, aby bylo pořadí stabilní pro cursor stránkování.
+    """
+    ordering_aliases = {
+        'price': 'price_amount',
+        'popularity': '-trending_score',
+    }
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [self._resolve_alias(term) for term in super().get_ordering(request, queryset, view)]
+        if not any(term.lstrip('-') == 'id' for term in ordering):
+            ordering.append('id')
+        return ordering
+
+    def _resolve_alias(self, term):
+        field = self.ordering_aliases.get(term.lstrip('-'), term.lstrip('-'))
+        if term.startswith('-'):
+            # Alias může mít vlastní směr (popularity = nejpopulárnější první)
+            return field[1:] if field.startswith('-') else f'-{field}'
+        return field
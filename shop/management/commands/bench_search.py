@@ -0,0 +1,51 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from shop.models import Product
+from shop.search import search_products
+
+
+ADJECTIVES = ['floral', 'denim', 'linen', 'oversized', 'slim', 'cropped', 'knitted', 'pleated', 'striped', 'basic']
+NOUNS = ['dress', 'jacket', 'shirt', 'skirt', 'sweater', 'coat', 'jeans', 'tee', 'blazer', 'hoodie']
+MANUFACTURERS = ['Zara', 'Mango', 'Levis', 'Reserved', 'Bershka', 'Nike', 'Adidas', 'Uniqlo']
+QUERIES = ['zara', 'floral dress', 'den', 'slim jeans', 'knit swe', 'uniqlo coat', 'oversized', 'bla']
+
+
+class Command(BaseCommand):
+    help = 'Změří latenci /products/search/ nad syntetickým katalogem (data se na konci zahodí).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write(f"Generating {options['products']} synthetic products...")
+            Product.objects.bulk_create(
+                (self._synthetic_product(i) for i in range(options['products'])),
+                batch_size=2000
+            )
+
+            for query in QUERIES:
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    page = list(search_products(Product.objects.all(), query)[:20])
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(f"{query!r:16} p50={statistics.median(timings):7.2f} ms  p95={p95:7.2f} ms  results={len(page)}")
+
+            transaction.set_rollback(True)
+
+    def _synthetic_product(self, index):
+        return Product(
+            name=f'{random.choice(ADJECTIVES)} {random.choice(NOUNS)}'[:21],
+            store_link='https://example.com/product',
+            image_url='https://example.com/product.jpg',
+            sku=f'BENCH{index:010d}',
+            clothing_category=random.choice(Product.CLOTHING_CATEGORY_CHOICES)[0],
+            manufacturer_name=random.choice(MANUFACTURERS),
+        )
@@ -0,0 +1,128 @@
+import csv
+import json
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from shop.models import Product
+from shop.pricing import parse_price
+from shop.tasks import mirror_product_images
+
+
+IMPORT_FIELDS = ['name', 'store_link', 'image_url', 'sku', 'clothing_type', 'clothing_category', 'manufacturer_name', 'colour', 'price']
+UPDATE_FIELDS = [field for field in IMPORT_FIELDS if field != 'sku'] + ['price_amount', 'price_currency', *Product.IMAGE_MIRROR_FIELDS]
+
+
+class Command(BaseCommand):
+    help = 'Importuje produkty z CSV nebo JSONL feedu (streamovaně, po dávkách, upsert podle SKU).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Výchozí podle přípony souboru')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=1000, help='Po tolika neplatných řádcích import skončí')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        batch_size = options['batch_size']
+        self.max_errors = options['max_errors']
+        self.errors = 0
+
+        imported = 0
+        started = time.monotonic()
+        batch = []
+        with open(options['path'], newline='', encoding='utf-8') as feed:
+            rows = self._read_csv(feed) if file_format == 'csv' else self._read_jsonl(feed)
+            for line_number, row in rows:
+                product = self._build_product(line_number, row)
+                if product is not None:
+                    batch.append(product)
+                if len(batch) >= batch_size:
+                    imported += self._write_batch(batch)
+                    batch = []
+                    self._report(imported, started)
+            if batch:
+                imported += self._write_batch(batch)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} products in {elapsed:.1f} s ({imported / elapsed if elapsed else 0:.0f} rows/s), {self.errors} invalid rows skipped"
+        ))
+
+    def _read_csv(self, feed):
+        for line_number, row in enumerate(csv.DictReader(feed), start=2):
+            yield line_number, row
+
+    def _read_jsonl(self, feed):
+        for line_number, line in enumerate(feed, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                self._error(line_number, f'invalid JSON: {e}')
+
+    def _build_product(self, line_number, row):
+        """Zvaliduje řádek pomocí validátorů polí modelu; neplatný řádek přeskočí."""
+        values = {}
+        try:
+            for name in IMPORT_FIELDS:
+                field = Product._meta.get_field(name)
+                value = row.get(name)
+                raw = '' if value is None else str(value).strip()
+                if not raw and field.has_default():
+                    raw = field.get_default()
+                if name == 'sku' and not raw:
+                    continue
+                values[name] = field.clean(raw, None)
+        except ValidationError as e:
+            self._error(line_number, f'{name}: {"; ".join(e.messages)}')
+            return None
+
+        product = Product(**values)
+        product.price_amount, product.price_currency = parse_price(product.price)
+        return product
+
+    def _write_batch(self, batch):
+        # Feed může obsahovat stejné SKU víckrát - v dávce platí poslední výskyt
+        by_sku = {}
+        without_sku = []
+        for product in batch:
+            if product.sku:
+                by_sku[product.sku] = product
+            else:
+                without_sku.append(product)
+
+        for product, sku in zip(without_sku, Product.allocate_skus(len(without_sku), reserved=by_sku)):
+            product.sku = sku
+
+        # U existujících produktů se stejným obrázkem zachováme hotové zrcadlo
+        existing = Product.objects.filter(sku__in=by_sku).values('sku', 'image_url', *Product.IMAGE_MIRROR_FIELDS)
+        for row in existing:
+            product = by_sku[row['sku']]
+            if row['image_url'] == product.image_url:
+                for field in Product.IMAGE_MIRROR_FIELDS:
+                    setattr(product, field, row[field])
+
+        products = [*by_sku.values(), *without_sku]
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=UPDATE_FIELDS,
+            )
+            to_mirror = [product.pk for product in products if not product.mirrored_image_url]
+            if to_mirror:
+                transaction.on_commit(lambda: mirror_product_images.delay(to_mirror))
+        return len(products)
+
+    def _report(self, imported, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"{imported} rows, {imported / elapsed if elapsed else 0:.0f} rows/s")
+
+    def _error(self, line_number, message):
+        self.errors += 1
+        self.stderr.write(f"Line {line_number}: {message}")
+        if self.errors >= self.max_errors:
+            raise CommandError(f"Too many invalid rows ({self.errors}), aborting")
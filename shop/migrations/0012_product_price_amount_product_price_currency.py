@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_catalogstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='price_amount',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_currency',
+            field=models.CharField(default='USD', max_length=3),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:54
+
+from django.db import migrations
+from shop.pricing import parse_price
+
+
+def populate_price_amount(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    products = list(Product.objects.only('id', 'price'))
+    for product in products:
+        product.price_amount, product.price_currency = parse_price(product.price)
+    Product.objects.bulk_update(products, ['price_amount', 'price_currency'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_product_price_amount_product_price_currency'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_price_amount, migrations.RunPython.noop),
+    ]
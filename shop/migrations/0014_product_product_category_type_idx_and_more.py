@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_populate_price_amount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['clothing_category', 'clothing_type'], name='product_category_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['clothing_type', 'clothing_category'], name='product_type_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['manufacturer_name', 'clothing_category'], name='product_manuf_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['colour', 'clothing_category'], name='product_colour_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['clothing_category', 'price_amount'], name='product_category_price_idx'),
+        ),
+    ]
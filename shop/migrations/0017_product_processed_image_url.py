@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+def schedule_preprocessing(apps, schema_editor):
+    # Revalidace bere produkty bez image_checked_at jako první a dopočítá jim vstup pro try-on
+    Product = apps.get_model('shop', 'Product')
+    Product.objects.update(image_checked_at=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_product_image_mirror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='processed_image_url',
+            field=models.URLField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(schedule_preprocessing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_popularity(apps, schema_editor):
+    # Počítadla z existujících dat; trending_score začíná z celkových počtů a dál vyhasíná
+    Product = apps.get_model('shop', 'Product')
+    FavoriteItem = apps.get_model('user', 'FavoriteItem')
+    TryOnResult = apps.get_model('tryon', 'TryOnResult')
+
+    def count_by_product(model):
+        counts = model.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(count=Count('id')).values('count')
+        return Coalesce(Subquery(counts), 0)
+
+    Product.objects.update(favorite_count=count_by_product(FavoriteItem), try_on_count=count_by_product(TryOnResult))
+    Product.objects.update(trending_score=(
+        F('favorite_count') * settings.POPULARITY_FAVORITE_WEIGHT + F('try_on_count') * settings.POPULARITY_TRY_ON_WEIGHT
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_product_processed_image_url'),
+        ('tryon', '0001_initial'),
+        ('user', '0002_favoriteitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='try_on_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-trending_score', 'id'], name='product_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['clothing_category', '-trending_score', 'id'], name='product_category_trending_idx'),
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+    ]
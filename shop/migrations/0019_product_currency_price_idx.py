@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price_currency', 'price_amount'], name='product_currency_price_idx'),
+        ),
+    ]
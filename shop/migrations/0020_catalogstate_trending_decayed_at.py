@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_product_currency_price_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogstate',
+            name='trending_decayed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
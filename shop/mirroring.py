@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+from urllib.parse import urlparse
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import UnidentifiedImageError
+from nandeback import imaging
+from nandeback.storage import DOWNLOAD_TIMEOUT, bucket_key_from_url
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MirrorError(Exception):
+    """Obrázek oděvu se nepodařilo zrcadlit."""
+
+
+def mirror_product_image(product):
+    """
+    Zkopíruje obrázek oděvu do našeho bucketu pod klíč garments/<sha256>.<ext>
+    a ze stejných dat připraví vstup pro idm-vton (preprocess_garment_image).
+
+    Při opakovaném běhu posílá If-None-Match s ETagem originálu, takže
+    nezměněný obrázek se znovu nestahuje. Stejný obsah u více produktů
+    (nebo po změně URL) se v bucketu uloží i zpracuje jen jednou.
+
+    Verzi katalogu nezvyšuje; vrátí True, pokud se změnila URL zrcadla,
+    a verzi pak zvýší volající jednou za dávku (mirror_product_images).
+    """
+    image_url = product.image_url
+    headers = {}
+    if product.mirrored_image_url and product.processed_image_url and product.image_etag:
+        headers['If-None-Match'] = product.image_etag
+
+    with requests.get(image_url, stream=True, timeout=DOWNLOAD_TIMEOUT, headers=headers) as response:
+        if response.status_code == 304:
+            Product.objects.filter(pk=product.pk, image_url=image_url).update(image_checked_at=timezone.now())
+            logger.info(f"Garment image of product {product.pk} unchanged")
+            return False
+        if response.status_code != 200:
+            raise MirrorError(f"Download of {image_url} failed with status {response.status_code}")
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if content_type and not content_type.startswith('image/'):
+            raise MirrorError(f"{image_url} is not an image ({content_type})")
+
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as buffer:
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.GARMENT_IMAGE_MAX_SIZE:
+                    raise MirrorError(f"{image_url} is larger than {settings.GARMENT_IMAGE_MAX_SIZE} bytes")
+                digest.update(chunk)
+                buffer.write(chunk)
+            sha256 = digest.hexdigest()
+
+            if bucket_key_from_url(image_url):
+                # Obrázek už je v našem bucketu, stačí ho předzpracovat
+                mirrored_image_url = image_url
+            else:
+                name = f'garments/{sha256}{_extension(image_url, content_type)}'
+                if not default_storage.exists(name):
+                    buffer.seek(0)
+                    name = default_storage.save(name, File(buffer, name=name))
+                mirrored_image_url = default_storage.url(name)
+
+            buffer.seek(0)
+            try:
+                processed_image_url = preprocess_garment_image(buffer, sha256)
+            except (UnidentifiedImageError, OSError) as e:
+                # Try-on pak použije zrcadlo bez předzpracování
+                logger.warning(f"Preprocessing garment image of product {product.pk} failed: {str(e)}")
+                processed_image_url = ''
+
+    updated = Product.objects.filter(pk=product.pk, image_url=image_url).update(
+        bump_catalog_version=False,
+        mirrored_image_url=mirrored_image_url,
+        processed_image_url=processed_image_url,
+        image_sha256=sha256,
+        image_etag=response.headers.get('ETag', ''),
+        image_checked_at=timezone.now(),
+    )
+    logger.info(f"Mirrored garment image of product {product.pk} ({sha256[:12]})")
+    return bool(updated) and mirrored_image_url != product.mirrored_image_url
+
+
+def preprocess_garment_image(fileobj, sha256):
+    """
+    Připraví obrázek oděvu jako vstup pro idm-vton: průhlednost vyplní bílou,
+    zmenší a doplní na TRYON_INPUT_SIZE se zachováním poměru stran a uloží
+    jako JPEG. Klíč obsahuje hash i rozměr, takže se počítá jen jednou.
+    """
+    width, height = settings.TRYON_INPUT_SIZE
+    name = f'garments/{sha256}_{width}x{height}.jpg'
+    if not default_storage.exists(name):
+        image = imaging.pad_to_size(imaging.flatten(imaging.open_image(fileobj)), settings.TRYON_INPUT_SIZE)
+        name = default_storage.save(name, imaging.encode(image, 'JPEG', quality=90))
+    return default_storage.url(name)
+
+
+def _extension(url, content_type):
+    extension = mimetypes.guess_extension(content_type) if content_type else None
+    if not extension:
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+    return {'.jpe': '.jpg', '.jpeg': '.jpg'}.get(extension, extension) or '.jpg'
@@ -1,6 +1,33 @@
 import random
 import string
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from .pricing import parse_price
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Hromadné zápisy obcházejí signály, verzi katalogu proto zvyšujeme tady
+    (bulk_update volá interně update(), delete() posílá signály sám).
+    """
+
+    def update(self, bump_catalog_version=True, **kwargs):
+        # bump_catalog_version=False: verzi zvýší volající sám, jednou za celou dávku
+        rows = super().update(**kwargs)
+        if rows and bump_catalog_version and not set(kwargs) <= self.model.CATALOG_NEUTRAL_FIELDS:
+            self._bump_catalog_version()
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if objs:
+            self._bump_catalog_version()
+        return objs
+
+    def _bump_catalog_version(self):
+        from .catalog import bump_catalog_version
+        bump_catalog_version()
+
 
 class Product(models.Model):
     CLOTHING_TYPE_CHOICES = [
@@ -37,17 +64,112 @@ class Product(models.Model):
     manufacturer_name = models.CharField(max_length=17)
     colour = models.CharField(max_length=5, choices=COLOUR_CHOICES, default='light')
     price = models.CharField(max_length=15, default="0 USD")
+    # Strukturovaná cena odvozená z `price` - pro řazení a filtrování v DB
+    price_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0, db_index=True)
+    price_currency = models.CharField(max_length=3, default='USD')
+    # Plní ho trigger v DB (viz shop/search.py); na SQLite se místo něj používá FTS5 tabulka
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Kopie obrázku oděvu v našem bucketu (garments/<sha256>), plní ji shop.tasks.mirror_product_images
+    mirrored_image_url = models.URLField(max_length=500, blank=True, editable=False)
+    image_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    image_etag = models.CharField(max_length=255, blank=True, editable=False)
+    image_checked_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    # Předzpracovaný vstup pro idm-vton (TRYON_INPUT_SIZE, bez průhlednosti, JPEG)
+    processed_image_url = models.URLField(max_length=500, blank=True, editable=False)
+    # Popularita - mění se jen přes F() v shop.popularity, úloha refresh_product_popularity je srovnává s DB
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+    try_on_count = models.PositiveIntegerField(default=0, editable=False)
+    trending_score = models.FloatField(default=0, editable=False)
+
+    IMAGE_MIRROR_FIELDS = ['mirrored_image_url', 'processed_image_url', 'image_sha256', 'image_etag', 'image_checked_at']
+    POPULARITY_FIELDS = ['favorite_count', 'try_on_count', 'trending_score']
+    # Pole, jejichž změna se v API katalogu neprojeví - update() kvůli nim verzi nezvyšuje
+    # (ze zrcadlení je v odpovědích vidět jen mirrored_image_url)
+    CATALOG_NEUTRAL_FIELDS = {'image_checked_at', 'processed_image_url', 'image_sha256', 'image_etag', *POPULARITY_FIELDS}
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Odpovídají cestám procházení katalogu v aplikaci (viz ProductFilter)
+        indexes = [
+            models.Index(fields=['clothing_category', 'clothing_type'], name='product_category_type_idx'),
+            models.Index(fields=['clothing_type', 'clothing_category'], name='product_type_category_idx'),
+            models.Index(fields=['manufacturer_name', 'clothing_category'], name='product_manuf_category_idx'),
+            models.Index(fields=['colour', 'clothing_category'], name='product_colour_category_idx'),
+            models.Index(fields=['clothing_category', 'price_amount'], name='product_category_price_idx'),
+            models.Index(fields=['price_currency', 'price_amount'], name='product_currency_price_idx'),
+            # ?ordering=popularity (s id jako tie-breakerem z CatalogOrderingFilter)
+            models.Index(fields=['-trending_score', 'id'], name='product_trending_idx'),
+            models.Index(fields=['clothing_category', '-trending_score', 'id'], name='product_category_trending_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Pamatujeme si načtenou URL, aby save() poznal změnu obrázku
+        instance._loaded_image_url = instance.__dict__.get('image_url')
+        return instance
+
+    @property
+    def display_image_url(self):
+        """Obrázek pro katalog - zrcadlo v našem bucketu, dokud není, tak originál."""
+        return self.mirrored_image_url or self.image_url
+
+    @property
+    def tryon_image_url(self):
+        """Obrázek oděvu pro try-on - předzpracovaný, jinak zrcadlo v našem bucketu, jinak originál."""
+        return self.processed_image_url or self.mirrored_image_url or self.image_url
 
     def save(self, *args, **kwargs):
         if not self.sku:  # Pokud SKU není nastavené, generuj nové
             self.sku = self.generate_sku()
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None or 'image_url' in update_fields) and self.image_url != getattr(self, '_loaded_image_url', None):
+            # Nový obrázek - zrcadlo se musí vytvořit znovu
+            self.mirrored_image_url, self.processed_image_url, self.image_sha256, self.image_etag, self.image_checked_at = '', '', '', '', None
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.IMAGE_MIRROR_FIELDS}
+        self.price_amount, self.price_currency = parse_price(self.price)
+        if not args and kwargs.get('update_fields') is None and not kwargs.get('force_insert') and not self._state.adding:
+            # Plné uložení (admin, API) nesmí přepsat počítadla popularity starými hodnotami
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.POPULARITY_FIELDS
+            ]
         super(Product, self).save(*args, **kwargs)
+        self._loaded_image_url = self.image_url
 
     def generate_sku(self):
-        """Generuje náhodné SKU."""
-        return ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+        """Generuje náhodné SKU, které ještě není v DB."""
+        return self.allocate_skus(1)[0]
+
+    @classmethod
+    def allocate_skus(cls, count, reserved=()):
+        """
+        Vygeneruje `count` unikátních SKU jedním dotazem do DB na kolo -
+        kolize s existujícími i vzájemné se přegenerují místo IntegrityError.
+        """
+        skus = set()
+        while len(skus) < count:
+            candidates = {
+                ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+                for _ in range(count - len(skus))
+            }
+            candidates -= set(reserved)
+            taken = set(cls.objects.filter(sku__in=candidates).values_list('sku', flat=True))
+            skus |= candidates - taken
+        return list(skus)
+
+    def __str__(self):
+        return self.name
 
 
+class CatalogState(models.Model):
+    """Jediný řádek s verzí katalogu - zvyšuje se při každé změně produktů (ETagy, cache)."""
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Poslední vyhasínání trending_score - další běh z něj počítá uplynulý čas
+    trending_decayed_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f"Catalog v{self.version}"
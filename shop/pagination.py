@@ -0,0 +1,17 @@
+from rest_framework.pagination import PageNumberPagination
+from nandeback.pagination import KeysetCursorPagination
+
+
+class ProductCursorPagination(KeysetCursorPagination):
+    """Keyset stránkování podle řazení z ?ordering (+ id) - cena stránky nezávisí na velikosti katalogu."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = 'id'
+
+
+class SearchPagination(PageNumberPagination):
+    """Výsledky hledání jsou řazené podle relevance, cursor zde nedává smysl."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .catalog import CATALOG_STATE_ID
+from .models import CatalogState, Product
+
+
+# Počítadla popularity na Product se mění atomicky přes F() při každém
+# oblíbení a try-onu (signály v user a tryon). Úloha refresh_product_popularity
+# je pravidelně srovná s COUNT(*) a nechá trending_score exponenciálně vyhasínat.
+
+
+def record_favorites(product_ids, delta):
+    """Přičte `delta` (+1/-1) k oblíbení všech produktů jedním UPDATE."""
+    Product.objects.filter(pk__in=product_ids).update(
+        favorite_count=Greatest(F('favorite_count') + delta, Value(0)),
+        trending_score=Greatest(F('trending_score') + delta * settings.POPULARITY_FAVORITE_WEIGHT, Value(0.0)),
+    )
+
+
+def record_try_ons(product_ids, delta):
+    """Přičte `delta` k try-onům; smazaný výsledek trending_score nesnižuje."""
+    weight = settings.POPULARITY_TRY_ON_WEIGHT if delta > 0 else 0
+    Product.objects.filter(pk__in=product_ids).update(
+        try_on_count=Greatest(F('try_on_count') + delta, Value(0)),
+        trending_score=F('trending_score') + delta * weight,
+    )
+
+
+def reconcile_popularity_counters(batch_size):
+    """
+    Přepočítá favorite_count a try_on_count po dávkách podle id a zapíše
+    jen produkty, kde se počítadlo rozešlo se skutečností. Vrátí jejich počet.
+    """
+    from tryon.models import TryOnResult
+    from user.models import FavoriteItem
+
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return fixed
+        last_id = ids[-1]
+
+        favorites = _counts_by_product(FavoriteItem.objects.filter(product_id__in=ids))
+        try_ons = _counts_by_product(TryOnResult.objects.filter(product_id__in=ids))
+        drifted = []
+        for product in Product.objects.filter(pk__in=ids).only('id', 'favorite_count', 'try_on_count'):
+            counts = (favorites.get(product.pk, 0), try_ons.get(product.pk, 0))
+            if (product.favorite_count, product.try_on_count) != counts:
+                product.favorite_count, product.try_on_count = counts
+                drifted.append(product)
+        Product.objects.bulk_update(drifted, ['favorite_count', 'try_on_count'])
+        fixed += len(drifted)
+
+
+def _counts_by_product(queryset):
+    return dict(queryset.order_by().values('product_id').annotate(count=Count('id')).values_list('product_id', 'count'))
+
+
+def claim_trending_decay():
+    """
+    Zapíše čas vyhasínání a vrátí sekundy od minulého. Volat v transakci
+    spolu s decay_trending_scores: řádek CatalogState zůstane zamčený, takže
+    souběžný nebo zpožděný běh nevyhasne stejný interval dvakrát. První běh
+    počítá s POPULARITY_REFRESH_INTERVAL.
+    """
+    state, _ = CatalogState.objects.select_for_update().get_or_create(pk=CATALOG_STATE_ID)
+    now = timezone.now()
+    CatalogState.objects.filter(pk=state.pk).update(trending_decayed_at=now)
+    if state.trending_decayed_at is None:
+        return settings.POPULARITY_REFRESH_INTERVAL
+    return max((now - state.trending_decayed_at).total_seconds(), 0)
+
+
+def decay_trending_scores(elapsed_seconds):
+    """Vynásobí trending_score faktorem podle poločasu; zanedbatelné skóre vynuluje."""
+    factor = 0.5 ** (elapsed_seconds / settings.POPULARITY_HALF_LIFE)
+    Product.objects.filter(trending_score__gt=0, trending_score__lt=0.01).update(trending_score=0)
+    return Product.objects.filter(trending_score__gt=0).update(trending_score=F('trending_score') * factor)
@@ -0,0 +1,46 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+
+DEFAULT_CURRENCY = 'USD'
+# Nejvyšší částka, kterou pojme Product.price_amount (DecimalField(max_digits=10, decimal_places=2))
+MAX_AMOUNT = Decimal('99999999.99')
+CURRENCY_SYMBOLS = {'$': 'USD', '€': 'EUR', '£': 'GBP', 'Kč': 'CZK'}
+
+_CURRENCY_CODE_RE = re.compile(r'\b([A-Z]{3})\b')
+_NUMBER_RE = re.compile(r'\d[\d\s.,]*')
+_FRACTION_RE = re.compile(r'^(.*?)(?:[.,](\d{1,2}))?$')
+
+
+def parse_price(value):
+    """
+    Rozloží textovou cenu na (Decimal, ISO kód měny), např. '19.99 USD',
+    '$19.99' nebo '1 299,00 Kč'. Oddělovač následovaný 1-2 číslicemi na konci
+    je desetinný, ostatní tečky a čárky jsou oddělovače tisíců. Nečitelná
+    nebo větší cena než MAX_AMOUNT se vrátí jako 0.00.
+    """
+    text = (value or '').strip()
+    number = _NUMBER_RE.search(text)
+    if not number:
+        return Decimal('0.00'), DEFAULT_CURRENCY
+
+    currency = DEFAULT_CURRENCY
+    code = _CURRENCY_CODE_RE.search(text)
+    if code:
+        currency = code.group(1)
+    else:
+        for symbol, iso_code in CURRENCY_SYMBOLS.items():
+            if symbol in text:
+                currency = iso_code
+                break
+
+    digits = re.sub(r'\s', '', number.group()).rstrip('.,')
+    integer, fraction = _FRACTION_RE.match(digits).groups()
+    try:
+        amount = Decimal(f"{re.sub(r'[.,]', '', integer) or '0'}.{fraction or '0'}")
+    except InvalidOperation:
+        return Decimal('0.00'), currency
+    amount = amount.quantize(Decimal('0.01'))
+    if amount > MAX_AMOUNT:
+        return Decimal('0.00'), currency
+    return amount, currency
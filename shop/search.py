@@ -0,0 +1,155 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, Q
+
+
+MIN_QUERY_LENGTH = 2
+
+_TERM_RE = re.compile(r'\w+')
+
+# Postgres: vážený tsvector (název > výrobce > kategorie) udržovaný triggerem,
+# GIN index nad ním a trigramové indexy pro překlepy a našeptávání
+POSTGRES_INSTALL_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE OR REPLACE FUNCTION shop_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('pg_catalog.simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('pg_catalog.simple', coalesce(NEW.manufacturer_name, '')), 'B') ||
+            setweight(to_tsvector('pg_catalog.simple', coalesce(NEW.clothing_category, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS shop_product_search_vector_trigger ON shop_product',
+    """
+    CREATE TRIGGER shop_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON shop_product
+    FOR EACH ROW EXECUTE FUNCTION shop_product_search_vector_update()
+    """,
+    'UPDATE shop_product SET id = id',
+    'CREATE INDEX IF NOT EXISTS shop_product_search_vector_idx ON shop_product USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS shop_product_name_trgm_idx ON shop_product USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS shop_product_manuf_trgm_idx ON shop_product USING gin (manufacturer_name gin_trgm_ops)',
+]
+
+POSTGRES_UNINSTALL_SQL = [
+    'DROP INDEX IF EXISTS shop_product_manuf_trgm_idx',
+    'DROP INDEX IF EXISTS shop_product_name_trgm_idx',
+    'DROP INDEX IF EXISTS shop_product_search_vector_idx',
+    'DROP TRIGGER IF EXISTS shop_product_search_vector_trigger ON shop_product',
+    'DROP FUNCTION IF EXISTS shop_product_search_vector_update()',
+]
+
+# SQLite (lokální vývoj a testy): FTS5 tabulka nad shop_product udržovaná triggery
+SQLITE_INSTALL_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts USING fts5(
+        name, manufacturer_name, clothing_category,
+        content='shop_product', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_product_fts_ai AFTER INSERT ON shop_product BEGIN
+        INSERT INTO shop_product_fts(rowid, name, manufacturer_name, clothing_category)
+        VALUES (new.id, new.name, new.manufacturer_name, new.clothing_category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_product_fts_ad AFTER DELETE ON shop_product BEGIN
+        INSERT INTO shop_product_fts(shop_product_fts, rowid, name, manufacturer_name, clothing_category)
+        VALUES ('delete', old.id, old.name, old.manufacturer_name, old.clothing_category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS shop_product_fts_au AFTER UPDATE ON shop_product BEGIN
+        INSERT INTO shop_product_fts(shop_product_fts, rowid, name, manufacturer_name, clothing_category)
+        VALUES ('delete', old.id, old.name, old.manufacturer_name, old.clothing_category);
+        INSERT INTO shop_product_fts(rowid, name, manufacturer_name, clothing_category)
+        VALUES (new.id, new.name, new.manufacturer_name, new.clothing_category);
+    END
+    """,
+    "INSERT INTO shop_product_fts(shop_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS shop_product_fts_au',
+    'DROP TRIGGER IF EXISTS shop_product_fts_ad',
+    'DROP TRIGGER IF EXISTS shop_product_fts_ai',
+    'DROP TABLE IF EXISTS shop_product_fts',
+]
+
+
+def _run(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_search_index(connection):
+    if connection.vendor == 'postgresql':
+        _run(connection, POSTGRES_INSTALL_SQL)
+    elif connection.vendor == 'sqlite':
+        _run(connection, SQLITE_INSTALL_SQL)
+
+
+def uninstall_search_index(connection):
+    if connection.vendor == 'postgresql':
+        _run(connection, POSTGRES_UNINSTALL_SQL)
+    elif connection.vendor == 'sqlite':
+        _run(connection, SQLITE_UNINSTALL_SQL)
+
+
+def ensure_sqlite_search_index(connection):
+    """
+    SQLite při ALTER TABLE tabulku přestaví a triggery zahodí - po každé
+    migraci je proto obnovíme (a FTS index přestavíme), pokud chybí.
+    """
+    if connection.vendor != 'sqlite' or 'shop_product' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'shop_product_fts_%'")
+        if cursor.fetchone()[0] == 3:
+            return
+    _run(connection, SQLITE_INSTALL_SQL)
+
+
+def search_products(queryset, query):
+    """
+    Vrátí produkty odpovídající dotazu seřazené podle relevance. Každé slovo
+    dotazu se bere jako prefix, aby fungovalo i našeptávání.
+    """
+    terms = _TERM_RE.findall(query.lower())
+    if not terms:
+        return queryset.none()
+
+    if connections[queryset.db].vendor == 'postgresql':
+        return _search_postgres(queryset, query, terms)
+    return _search_sqlite(queryset, terms)
+
+
+def _search_postgres(queryset, query, terms):
+    ts_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
+    return (
+        queryset
+        .filter(Q(search_vector=ts_query) | Q(name__trigram_word_similar=query))
+        .annotate(search_rank=SearchRank(F('search_vector'), ts_query) + TrigramWordSimilarity(query, 'name'))
+        .order_by('-search_rank', 'id')
+    )
+
+
+def _search_sqlite(queryset, terms):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    # bm25 vrací menší číslo pro lepší shodu; váhy sloupců jako na Postgresu
+    return (
+        queryset
+        .extra(
+            tables=['shop_product_fts'],
+            where=['shop_product_fts.rowid = shop_product.id', 'shop_product_fts MATCH %s'],
+            params=[match],
+            select={'search_rank': 'bm25(shop_product_fts, 10.0, 5.0, 2.0)'},
+        )
+        .order_by('search_rank', 'id')
+    )
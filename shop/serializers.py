@@ -1,7 +1,24 @@
 from rest_framework import serializers
+from nandeback.sparse import CachedFieldsMixin
+from user.favorites import contains
 from .models import Product
 
-class ProductSerializer(serializers.ModelSerializer):
+# Pole pro mřížku produktů (?compact=1)
+PRODUCT_COMPACT_FIELDS = ['id', 'name', 'image_url', 'price', 'price_amount', 'price_currency']
+
+class ProductSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'name', 'store_link', 'image_url', 'sku', 'clothing_type', 'clothing_category', 'manufacturer_name', 'colour', 'price']
+        fields = ['id', 'name', 'store_link', 'image_url', 'sku', 'clothing_type', 'clothing_category', 'manufacturer_name', 'colour', 'price', 'price_amount', 'price_currency']
+        read_only_fields = ['price_amount', 'price_currency']
+
+    def to_representation(self, instance):
+        ret = super().to_representation(instance)
+        # Klienti načítají obrázek z našeho bucketu, jakmile je zrcadlo hotové
+        if 'image_url' in ret:
+            ret['image_url'] = instance.display_image_url
+        # ?with_favorites=1 - id oblíbených z cache (ProductViewSet)
+        favorite_ids = self.context.get('favorite_ids')
+        if favorite_ids is not None:
+            ret['is_favorite'] = contains(favorite_ids, instance.pk)
+        return ret
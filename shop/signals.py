@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .catalog import bump_catalog_version
+from .models import Product
+from .tasks import mirror_product_images
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_catalog_version_on_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def mirror_product_image_on_save(sender, instance, raw=False, **kwargs):
+    if raw or instance.mirrored_image_url:
+        return
+    transaction.on_commit(lambda: mirror_product_images.delay([instance.pk]))
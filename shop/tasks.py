@@ -0,0 +1,60 @@
+import logging
+from datetime import timedelta
+import requests
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .catalog import bump_catalog_version
+from .mirroring import MirrorError, mirror_product_image
+from .models import Product
+from .popularity import claim_trending_decay, decay_trending_scores, reconcile_popularity_counters
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def mirror_product_images(product_ids):
+    products = Product.objects.filter(pk__in=product_ids).only('id', 'image_url', *Product.IMAGE_MIRROR_FIELDS)
+    changed = False
+    for product in products:
+        try:
+            changed |= mirror_product_image(product)
+        except (MirrorError, requests.RequestException) as e:
+            # Stávající zrcadlo zůstává v platnosti, další pokus až při revalidaci
+            logger.warning(f"Mirroring image of product {product.pk} failed: {str(e)}")
+            Product.objects.filter(pk=product.pk).update(image_checked_at=timezone.now())
+    if changed:
+        # Jedno zvýšení za dávku - backfill zrcadel nesmí zneplatnit katalog za každý produkt
+        bump_catalog_version()
+
+
+@shared_task
+def revalidate_product_images():
+    """Znovu ověří nejdéle nekontrolované originály (a dozrcadlí produkty, kterým zrcadlo chybí)."""
+    cutoff = timezone.now() - timedelta(seconds=settings.GARMENT_IMAGE_REVALIDATE_AGE)
+    product_ids = list(
+        Product.objects
+        .filter(Q(image_checked_at__isnull=True) | Q(image_checked_at__lt=cutoff))
+        .order_by(F('image_checked_at').asc(nulls_first=True))
+        .values_list('id', flat=True)[:settings.GARMENT_IMAGE_REVALIDATE_BATCH]
+    )
+    logger.info(f"Revalidating garment images of {len(product_ids)} products")
+    mirror_product_images(product_ids)
+
+
+@shared_task
+def refresh_product_popularity():
+    """
+    Srovná počítadla popularity se skutečností a nechá trending_score
+    vyhasínat. Změny počítadel verzi katalogu nezvyšují, takže ji zvedneme
+    jednou tady - odpovědi řazené podle popularity se obnoví každý běh.
+    """
+    fixed = reconcile_popularity_counters(settings.POPULARITY_RECONCILE_BATCH)
+    with transaction.atomic():
+        # Skutečně uplynulý čas - beat běhy zpožďuje nebo vynechává
+        decayed = decay_trending_scores(claim_trending_decay())
+    bump_catalog_version()
+    logger.info(f"Product popularity refreshed: {fixed} counters reconciled, {decayed} trending scores decayed")
@@ -1,3 +1,347 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from .filters import CatalogOrderingFilter, ProductFilter
+from .catalog import CATALOG_STATE_ID, get_catalog_state
+from .models import CatalogState, Product
+from .tasks import mirror_product_images, refresh_product_popularity
+from .pricing import MAX_AMOUNT, parse_price
 
-# Create your tests here.
+
+# Kombinace filtrů, které aplikace při procházení katalogu skutečně posílá
+SUPPORTED_FILTERS = [
+    'clothing_category=top',
+    'clothing_category=top&clothing_type=upper_body',
+    'clothing_category__in=top,dress',
+    'clothing_type=upper_body',
+    'clothing_type__in=upper_body,dresses',
+    'manufacturer_name=Zara',
+    'manufacturer_name=Zara&clothing_category=top',
+    'manufacturer_name__in=Zara,Mango',
+    'colour=light',
+    'colour=light&clothing_category=top',
+    'price_min=10&price_max=50',
+    'clothing_category=top&price_min=10&price_max=50',
+    'price_currency=USD',
+    'price_currency=USD&price_min=10&price_max=50',
+]
+
+# ?ordering=popularity musí jít přímo z indexu (bez řazení v paměti)
+POPULARITY_QUERIES = [
+    '',
+    'clothing_category=top',
+]
+
+
+class ProductFilterIndexTests(TestCase):
+    """Hlídá, že žádná podporovaná kombinace filtrů nespadne do sekvenčního scanu."""
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Na malé testovací tabulce by planner index stejně nepoužil
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                return queryset.explain()
+        return queryset.explain()
+
+    def assert_uses_index(self, plan):
+        if connection.vendor == 'postgresql':
+            self.assertIn('Index', plan)
+            self.assertNotIn('Seq Scan', plan)
+        elif connection.vendor == 'sqlite':
+            self.assertRegex(plan, r'USING (COVERING )?INDEX')
+            self.assertNotRegex(plan, r'SCAN shop_product(?! USING)')
+        else:
+            self.skipTest(f'EXPLAIN check not implemented for {connection.vendor}')
+
+    def test_supported_filters_use_index(self):
+        for query in SUPPORTED_FILTERS:
+            with self.subTest(query=query):
+                filterset = ProductFilter(QueryDict(query), queryset=Product.objects.all())
+                self.assertTrue(filterset.is_valid(), filterset.errors)
+                self.assert_uses_index(self.explain(filterset.qs))
+
+    def test_popularity_ordering_uses_index(self):
+        ordering = [CatalogOrderingFilter()._resolve_alias('popularity'), 'id']
+        for query in POPULARITY_QUERIES:
+            with self.subTest(query=query):
+                filterset = ProductFilter(QueryDict(query), queryset=Product.objects.all())
+                self.assertTrue(filterset.is_valid(), filterset.errors)
+                plan = self.explain(filterset.qs.order_by(*ordering)[:50])
+                self.assert_uses_index(plan)
+                if connection.vendor == 'sqlite':
+                    self.assertNotIn('TEMP B-TREE', plan)
+                elif connection.vendor == 'postgresql':
+                    self.assertNotIn('Sort', plan)
+
+
+class ProductCursorPaginationTests(TestCase):
+    """Cursor musí projít i víc než 1000 produktů se stejnou hodnotou řazení (limit offsetu v DRF)."""
+
+    TIED_PRODUCTS = 1300
+
+    @classmethod
+    def setUpTestData(cls):
+        skus = Product.allocate_skus(cls.TIED_PRODUCTS)
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {i}',
+                sku=skus[i],
+                store_link=f'https://shop.example.com/{i}',
+                image_url=f'https://shop.example.com/{i}.jpg',
+                clothing_category='top',
+                price='10.00 USD',
+                price_amount='10.00',
+            )
+            for i in range(cls.TIED_PRODUCTS)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def page_through(self, query):
+        client = APIClient()
+        seen = []
+        url = f'/products/?{query}&page_size=200'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(product['id'] for product in response.data['results'])
+            self.assertLessEqual(len(seen), self.TIED_PRODUCTS, 'pagination loops')
+            url = response.data['next']
+        return seen
+
+    def test_price_ordering_pages_through_ties(self):
+        for query in ('ordering=price', 'ordering=-price'):
+            with self.subTest(query=query):
+                seen = self.page_through(query)
+                self.assertEqual(len(seen), self.TIED_PRODUCTS)
+                self.assertEqual(set(seen), set(Product.objects.values_list('id', flat=True)))
+
+    def test_popularity_ordering_pages_through_ties(self):
+        # Až na pět nejpopulárnějších mají produkty trending_score 0 - pořadí drží jen id
+        Product.objects.filter(pk__in=Product.objects.order_by('pk').values('pk')[:5]).update(trending_score=2.5)
+        for query in ('ordering=popularity', 'ordering=-popularity', 'ordering=popularity&clothing_category=top'):
+            with self.subTest(query=query):
+                seen = self.page_through(query)
+                self.assertEqual(len(seen), self.TIED_PRODUCTS)
+                self.assertEqual(set(seen), set(Product.objects.values_list('id', flat=True)))
+        self.assertEqual(self.page_through('ordering=popularity')[:5], list(Product.objects.order_by('pk').values_list('pk', flat=True)[:5]))
+
+    def test_previous_link_returns_previous_page(self):
+        client = APIClient()
+        first = client.get('/products/?ordering=price&page_size=200').data
+        second = client.get(first['next']).data
+        back = client.get(second['previous']).data
+        self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in first['results']])
+
+
+class ParsePriceTests(TestCase):
+    def test_formats(self):
+        for text, expected in (
+            ('19.99 USD', ('19.99', 'USD')),
+            ('$19.99', ('19.99', 'USD')),
+            ('1 299,00 Kč', ('1299.00', 'CZK')),
+            ('€1.299', ('1299.00', 'EUR')),
+            ('', ('0.00', 'USD')),
+        ):
+            with self.subTest(text=text):
+                amount, currency = parse_price(text)
+                self.assertEqual((str(amount), currency), expected)
+
+    def test_amount_beyond_column_is_rejected(self):
+        self.assertEqual(parse_price('99999999.99 EUR'), (MAX_AMOUNT, 'EUR'))
+        self.assertEqual(str(parse_price('100000000 EUR')[0]), '0.00')
+        self.assertEqual(str(parse_price('999999999999999')[0]), '0.00')
+
+    def test_product_with_huge_price_saves(self):
+        product = Product.objects.create(
+            name='Huge', store_link='https://shop.example.com/huge', image_url='https://shop.example.com/huge.jpg',
+            clothing_category='top', price='123456789012 USD',
+        )
+        product.refresh_from_db()
+        self.assertEqual(str(product.price_amount), '0.00')
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def product(name, manufacturer, category='top'):
+            return Product.objects.create(
+                name=name, manufacturer_name=manufacturer, clothing_category=category,
+                store_link='https://shop.example.com/p', image_url='https://shop.example.com/p.jpg',
+            )
+
+        cls.linen_shirt = product('Linen Shirt', 'Mango')
+        cls.zara_tee = product('Basic Tee', 'Zara')
+        cls.zara_named = product('Zara Summer Dress', 'Mango', 'dress')
+        cls.jacket = product('Denim Jacket', 'Levis')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = APIClient().get('/products/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.data['results']]
+
+    def test_matches_name_manufacturer_and_prefix(self):
+        self.assertEqual(self.search('linen'), [self.linen_shirt.pk])
+        self.assertEqual(self.search('lin'), [self.linen_shirt.pk])
+        self.assertEqual(self.search('denim jack'), [self.jacket.pk])
+        self.assertCountEqual(self.search('mango'), [self.linen_shirt.pk, self.zara_named.pk])
+
+    def test_name_match_ranks_above_manufacturer(self):
+        self.assertEqual(self.search('zara'), [self.zara_named.pk, self.zara_tee.pk])
+
+    def test_filters_apply_to_search(self):
+        response = APIClient().get('/products/search/', {'q': 'zara', 'clothing_category': 'top'})
+        self.assertEqual([product['id'] for product in response.data['results']], [self.zara_tee.pk])
+
+    def test_no_match_and_short_query(self):
+        self.assertEqual(self.search('nothing'), [])
+        self.assertEqual(APIClient().get('/products/search/', {'q': 'z'}).status_code, 400)
+        self.assertEqual(APIClient().get('/products/search/').status_code, 400)
+
+    def test_renamed_product_is_found_by_new_name(self):
+        self.jacket.name = 'Wool Coat'
+        self.jacket.save()
+        self.assertEqual(self.search('wool'), [self.jacket.pk])
+        self.assertEqual(self.search('denim'), [])
+
+
+class ProductDetailCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name='Detail', store_link='https://shop.example.com/detail', image_url='https://shop.example.com/detail.jpg',
+            clothing_category='top', price='20 USD',
+        )
+        self.url = f'/products/{self.product.pk}/'
+
+    def test_sparse_and_full_payloads_are_cached_separately(self):
+        client = APIClient()
+        compact = client.get(self.url, {'compact': 1})
+        full = client.get(self.url)
+
+        self.assertEqual(full.status_code, 200)
+        self.assertIn('store_link', full.data)
+        self.assertNotIn('store_link', compact.data)
+        self.assertNotEqual(compact['ETag'], full['ETag'])
+        self.assertEqual(client.get(self.url, HTTP_IF_NONE_MATCH=compact['ETag']).status_code, 200)
+        self.assertEqual(client.get(self.url, {'compact': 1}, HTTP_IF_NONE_MATCH=compact['ETag']).status_code, 304)
+        self.assertEqual(set(client.get(self.url, {'fields': 'id,name'}).data), {'id', 'name'})
+
+
+def image_response(status_code=200, etag='"v1"'):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 60), (10, 20, 30)).save(buffer, 'PNG')
+    response = mock.MagicMock(status_code=status_code, headers={'Content-Type': 'image/png', 'ETag': etag})
+    response.iter_content.return_value = [buffer.getvalue()]
+    response.__enter__.return_value = response
+    return response
+
+
+class ProductMirroringTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        storage = override_settings(MEDIA_ROOT=media.name, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.products = [
+            Product.objects.create(
+                name=f'Mirror {i}', store_link='https://shop.example.com/m', image_url=f'https://cdn.example.com/{i}.png',
+                clothing_category='top',
+            )
+            for i in range(3)
+        ]
+
+    def mirror(self, response):
+        with mock.patch('shop.mirroring.requests.get', return_value=response):
+            mirror_product_images([product.pk for product in self.products])
+
+    def test_mirroring_bumps_catalog_version_once_per_run(self):
+        version = get_catalog_state().version
+        self.mirror(image_response())
+
+        self.assertEqual(get_catalog_state().version, version + 1)
+        for product in Product.objects.filter(pk__in=[product.pk for product in self.products]):
+            self.assertTrue(product.mirrored_image_url)
+            self.assertTrue(product.processed_image_url)
+
+        # Nezměněný originál (304) ani stejné zrcadlo verzi nezvýší
+        self.mirror(image_response(status_code=304))
+        self.mirror(image_response(etag='"v2"'))
+        self.assertEqual(get_catalog_state().version, version + 1)
+
+
+class CatalogPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name='Catalog', store_link='https://shop.example.com/c', image_url='https://cdn.example.com/c.png',
+            clothing_category='top',
+        )
+
+    def test_tracking_params_share_cached_page(self):
+        first = self.client.get('/catalog/?category=top&utm_source=newsletter')
+        self.assertEqual(first.status_code, 200)
+        self.assertContains(first, '<link rel="canonical" href="http://testserver/catalog/?category=top">')
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/catalog/?fbclid=abc&category=top')
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.content, first.content)
+
+        self.assertNotEqual(self.client.get('/catalog/?category=bottom')['ETag'], first['ETag'])
+
+    def test_detail_ignores_query(self):
+        first = self.client.get(f'/catalog/{self.product.pk}/?utm_campaign=spring')
+        self.assertContains(first, f'<link rel="canonical" href="http://testserver/catalog/{self.product.pk}/">')
+        self.assertEqual(self.client.get(f'/catalog/{self.product.pk}/')['ETag'], first['ETag'])
+
+    def test_missing_product_is_not_found(self):
+        self.assertEqual(self.client.get('/catalog/99999999/').status_code, 404)
+
+
+@override_settings(POPULARITY_HALF_LIFE=3600, POPULARITY_REFRESH_INTERVAL=3600)
+class TrendingDecayTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name='Trending', store_link='https://shop.example.com/t', image_url='https://cdn.example.com/t.png',
+            clothing_category='top', mirrored_image_url='https://cdn.example.com/t.png',
+        )
+        Product.objects.filter(pk=self.product.pk).update(trending_score=8)
+
+    def trending_score(self):
+        self.product.refresh_from_db(fields=['trending_score'])
+        return self.product.trending_score
+
+    def test_decay_uses_time_since_last_run(self):
+        # První běh nemá s čím srovnat a počítá s intervalem beatu
+        refresh_product_popularity()
+        self.assertAlmostEqual(self.trending_score(), 4, places=3)
+
+        # Vynechané běhy - poslední vyhasínání před dvěma poločasy
+        CatalogState.objects.filter(pk=CATALOG_STATE_ID).update(trending_decayed_at=timezone.now() - timedelta(hours=2))
+        refresh_product_popularity()
+        self.assertAlmostEqual(self.trending_score(), 1, places=3)
+
+        # Hned opakovaný běh skoro nic neubere
+        refresh_product_popularity()
+        self.assertAlmostEqual(self.trending_score(), 1, places=3)
@@ -1,10 +1,7 @@
-from django.urls import path, include
-from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet
-
-router = DefaultRouter()
-router.register(r'products', ProductViewSet)
+from django.urls import path
+from .views import product_detail_page, product_list_page
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', product_list_page, name='catalog-product-list'),
+    path('<int:pk>/', product_detail_page, name='catalog-product-detail'),
 ]
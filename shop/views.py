@@ -1,15 +1,194 @@
-from rest_framework import viewsets
+import logging
+import time
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import HttpResponse, QueryDict
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
+from nandeback.sparse import model_field_names, requested_fields, sparse_serializer
+from user.favorites import favorites_state, get_favorite_ids
+from .catalog import cache_response, catalog_etag, get_cached_response, get_catalog_state, normalize_query
+from .filters import CatalogOrderingFilter, ProductFilter
 from .models import Product
-from .serializers import ProductSerializer
+from .pagination import ProductCursorPagination, SearchPagination
+from .search import MIN_QUERY_LENGTH, search_products
+from .serializers import PRODUCT_COMPACT_FIELDS, ProductSerializer
+
+
+logger = logging.getLogger(__name__)
+
 
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['clothing_category']
+    filter_backends = [DjangoFilterBackend, CatalogOrderingFilter]
+    filterset_class = ProductFilter
+    ordering_fields = ['id', 'price', 'popularity']
+    ordering = ['id']
+    pagination_class = ProductCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self._sparse_fields()
+        if fields:
+            only = model_field_names(Product, fields)
+            if 'image_url' in only:
+                only.append('mirrored_image_url')
+            queryset = queryset.only(*only)
+        return queryset
+
+    def get_serializer_class(self):
+        fields = self._sparse_fields()
+        return sparse_serializer(ProductSerializer, fields) if fields else ProductSerializer
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self._with_favorites():
+            context['favorite_ids'] = get_favorite_ids(self.request.user.pk)
+        return context
+
+    def _sparse_fields(self):
+        """?fields=... nebo ?compact=1 - jen pro čtení, zápisy vždy přes plný serializer."""
+        if self.request is None or self.request.method != 'GET':
+            return None
+        return requested_fields(self.request.query_params, ProductSerializer.Meta.fields, PRODUCT_COMPACT_FIELDS)
+
+    def _with_favorites(self):
+        """?with_favorites=1 doplní přihlášenému uživateli ke každému produktu is_favorite."""
+        return (
+            self.request is not None
+            and self.request.method == 'GET'
+            and self.request.query_params.get('with_favorites') in ('1', 'true')
+            and self.request.user.is_authenticated
+        )
 
     def list(self, request, *args, **kwargs):
-        # Pro účely ladění vypíšeme požadavek a parametry
-        print("Request params:", request.query_params)
-        return super().list(request, *args, **kwargs)
\ No newline at end of file
+        return self._conditional(request, normalize_query(request.query_params), super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        # ?fields= a ?compact=1 mění payload, proto musí být v klíči i dotaz
+        etag_key = f"product:{kwargs.get('pk')}:{normalize_query(request.query_params)}"
+        return self._conditional(request, etag_key, super().retrieve, *args, **kwargs)
+
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if len(query) < MIN_QUERY_LENGTH:
+            return Response({'error': f'Query must be at least {MIN_QUERY_LENGTH} characters long'}, status=status.HTTP_400_BAD_REQUEST)
+        return self._conditional(request, normalize_query(request.query_params), self._search, query)
+
+    def _search(self, request, query):
+        started = time.monotonic()
+        queryset = search_products(self.filter_queryset(self.get_queryset()), query)
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        response = paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+        elapsed_ms = (time.monotonic() - started) * 1000
+        logger.info(f"catalog.search duration_ms={elapsed_ms:.1f} q={query!r} results={paginator.page.paginator.count}")
+        return response
+
+    def _conditional(self, request, etag_key, view, *args, **kwargs):
+        """
+        ETag a Last-Modified odvozené z verze katalogu - nezměněná stránka
+        vrátí 304 bez dotazu na produkty a bez serializace. Hotová data
+        odpovědi se cachují pod stejným klíčem.
+        """
+        state = get_catalog_state()
+        if self._with_favorites():
+            # is_favorite je per-uživatel - klíč musí obsahovat i jeho oblíbené
+            # a Last-Modified (jen podle katalogu) by změnu oblíbených nezachytil
+            etag = catalog_etag(state, request.path, etag_key, str(request.user.pk), favorites_state(request.user.pk))
+            last_modified = None
+        else:
+            etag = catalog_etag(state, request.path, etag_key)
+            last_modified = int(state.updated_at.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            data = get_cached_response(etag)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache_response(etag, response.data)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+# Webový katalog pro SEO a sdílené odkazy
+
+
+CATALOG_LIST_PARAMS = ('category', 'page')
+
+
+def product_list_page(request):
+    def render_page(state, canonical_url):
+        products = Product.objects.only('id', 'name', 'image_url', 'mirrored_image_url', 'manufacturer_name', 'price').order_by('id')
+        category = request.GET.get('category')
+        if category:
+            products = products.filter(clothing_category=category)
+        page_obj = Paginator(products, settings.CATALOG_PAGE_SIZE).get_page(request.GET.get('page'))
+        return render(request, 'shop/product_list.html', {
+            'page_obj': page_obj,
+            'category': category,
+            'canonical_url': canonical_url,
+            'catalog_version': state.version,
+            'fragment_timeout': settings.CATALOG_RESPONSE_CACHE_TTL,
+        })
+    return _cached_catalog_page(request, render_page, CATALOG_LIST_PARAMS)
+
+
+def product_detail_page(request, pk):
+    def render_page(state, canonical_url):
+        product = get_object_or_404(Product, pk=pk)
+        return render(request, 'shop/product_detail.html', {
+            'product': product,
+            'canonical_url': canonical_url,
+            'catalog_version': state.version,
+            'fragment_timeout': settings.CATALOG_RESPONSE_CACHE_TTL,
+        })
+    return _cached_catalog_page(request, render_page)
+
+
+def _cached_catalog_page(request, render_page, params=()):
+    """
+    Celá vyrenderovaná stránka se cachuje pod ETagem odvozeným z verze
+    katalogu, takže opakované požadavky (crawlery) DB nezatěžují. Veřejné
+    Cache-Control hlavičky umožní stránky držet i na CDN.
+
+    Do klíče jdou jen parametry, které stránka čte (params); utm_*, fbclid
+    a podobné tak sdílí jeden záznam. Z nich je i kanonická URL, protože
+    stránka v cache je stejná pro všechny varianty dotazu.
+    """
+    query = QueryDict(mutable=True)
+    for key in params:
+        if key in request.GET:
+            query.setlist(key, request.GET.getlist(key))
+    canonical_url = request.build_absolute_uri(request.path + (f'?{query.urlencode()}' if query else ''))
+
+    state = get_catalog_state()
+    etag = catalog_etag(state, request.path, normalize_query(query))
+    last_modified = int(state.updated_at.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content = get_cached_response(etag)
+        if content is not None:
+            response = HttpResponse(content)
+        else:
+            response = render_page(state, canonical_url)
+            cache_response(etag, response.content)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=settings.CATALOG_PAGE_MAX_AGE, s_maxage=settings.CATALOG_PAGE_SHARED_MAX_AGE)
+    return response
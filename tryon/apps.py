@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TryonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tryon'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from .models import TryOnJob
+from .serializers import TryOnJobSerializer
+
+
+STATE_KEY_PREFIX = 'tryon:job-state:'
+
+# Stav jobu pro SSE stream (/tryon/jobs/<id>/events/) se čte z cache, ne z DB:
+# každá změna jobu ho sem zapíše po commitu (signals.py), takže čekající
+# klienti DB vůbec nezatěžují a nedrží žádné spojení.
+
+
+def _state_key(job_id):
+    return f'{STATE_KEY_PREFIX}{job_id}'
+
+
+def job_state(job):
+    data = dict(TryOnJobSerializer(job).data)
+    data['logs'] = job.logs[-2000:]
+    return data
+
+
+def publish_job_state(job):
+    cache.set(_state_key(job.pk), job_state(job), settings.TRYON_EVENTS_MAX_DURATION)
+
+
+def load_job_state(job_id):
+    """Stav jobu z cache; při miss (vypršel nebo job vznikl před nasazením) ho načte z DB a spojení hned zavře."""
+    state = cache.get(_state_key(job_id))
+    if state is None:
+        try:
+            job = TryOnJob.objects.select_related('result').get(pk=job_id)
+        finally:
+            connection.close()
+        state = job_state(job)
+        cache.set(_state_key(job_id), state, settings.TRYON_EVENTS_MAX_DURATION)
+    return state
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_alter_product_price'),
+        ('tryon', '0002_tryonjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TryOnCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('human_image', models.URLField(db_index=True, max_length=1000)),
+                ('model_version', models.CharField(max_length=200)),
+                ('category', models.CharField(max_length=50)),
+                ('result_image', models.URLField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='try_on_cache_entries', to='shop.product')),
+            ],
+        ),
+    ]
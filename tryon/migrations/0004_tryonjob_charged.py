@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tryon', '0003_tryoncacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tryonjob',
+            name='charged',
+            field=models.BooleanField(default=False),
+        ),
+    ]
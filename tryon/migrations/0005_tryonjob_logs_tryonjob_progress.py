@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tryon', '0004_tryonjob_charged'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tryonjob',
+            name='logs',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='tryonjob',
+            name='progress',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tryon', '0005_tryonjob_logs_tryonjob_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tryonresult',
+            name='medium_image',
+            field=models.URLField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='tryonresult',
+            name='thumbnail_image',
+            field=models.URLField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='tryonresult',
+            name='webp_image',
+            field=models.URLField(blank=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from user.models import CustomUser
 from shop.models import Product
 
@@ -6,10 +7,85 @@ class TryOnResult(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     result_image = models.URLField()
+    webp_image = models.URLField(blank=True)
+    medium_image = models.URLField(blank=True)
+    thumbnail_image = models.URLField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Try-on result for {self.user.username} and {self.product.name}"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+
+class TryOnJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_UPLOADING = 'uploading'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_UPLOADING, 'Uploading'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    FINAL_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='try_on_jobs')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    human_image = models.URLField(max_length=1000)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result = models.ForeignKey(TryOnResult, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    error = models.TextField(blank=True)
+    progress = models.PositiveSmallIntegerField(null=True, blank=True)
+    logs = models.TextField(blank=True)
+    charged = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Try-on job {self.pk} ({self.status}) for {self.user.username}"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINAL_STATUSES
+
+    def set_status(self, status, **fields):
+        """Uloží nový stav jobu spolu s případnými dalšími poli."""
+        self.status = status
+        for attr, value in fields.items():
+            setattr(self, attr, value)
+        self.save(update_fields=['status', 'updated_at', *fields])
+
+    def fail(self, error):
+        """Označí job jako neúspěšný a vrátí uživateli předem stržený kredit za try-on."""
+        self.set_status(self.STATUS_FAILED, error=error)
+        if self.charged:
+            CustomUser.objects.filter(pk=self.user_id).update(
+                virtual_try_ons_remaining=models.F('virtual_try_ons_remaining') + 1
+            )
+            self.charged = False
+            self.save(update_fields=['charged'])
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class TryOnCacheEntry(models.Model):
+    key = models.CharField(max_length=64, unique=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='try_on_cache_entries')
+    human_image = models.URLField(max_length=1000, db_index=True)
+    model_version = models.CharField(max_length=200)
+    category = models.CharField(max_length=50)
+    result_image = models.URLField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Try-on cache entry {self.key[:12]} for {self.product.name}"
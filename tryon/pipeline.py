@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import replicate
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from nandeback.storage import RemoteFileError, bucket_key_from_url, copy_url_to_storage
+
+
+logger = logging.getLogger(__name__)
+
+_http_lock = threading.Lock()
+_http_session = None
+_probe_executor = None
+_async_clients = {}
+
+
+class TryOnError(Exception):
+    """Chyba try-on pipeline, jejíž zpráva se může vrátit klientovi."""
+
+
+class InputNotAccessible(TryOnError):
+    """Obrázek oděvu nebo profilová fotka nejsou dostupné."""
+
+
+def get_http_session():
+    """Sdílená session s poolem keep-alive spojení (vytváří se líně, až po forku workeru)."""
+    global _http_session
+    with _http_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=20, pool_maxsize=settings.TRYON_PROBE_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+    return _http_session
+
+
+def _get_probe_executor():
+    global _probe_executor
+    with _http_lock:
+        if _probe_executor is None:
+            _probe_executor = ThreadPoolExecutor(
+                max_workers=settings.TRYON_PROBE_POOL_SIZE,
+                thread_name_prefix='tryon-probe'
+            )
+    return _probe_executor
+
+
+def _reachable_cache_key(url):
+    return 'tryon:reachable:' + hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def is_url_accessible(url, timeout=None):
+    # Objekty v našem bucketu zapisujeme my dřív, než jejich URL uložíme - není co ověřovat
+    if bucket_key_from_url(url):
+        return True
+
+    cache_key = _reachable_cache_key(url)
+    if cache.get(cache_key):
+        return True
+
+    try:
+        response = get_http_session().head(url, timeout=timeout or settings.TRYON_PROBE_TIMEOUT, allow_redirects=True)
+    except requests.RequestException as e:
+        logger.warning(f"URL accessibility check failed for {url}: {e}")
+        return False
+
+    if response.status_code != 200:
+        logger.warning(f"URL accessibility check failed for {url}: status {response.status_code}")
+        return False
+
+    cache.set(cache_key, True, settings.TRYON_PROBE_CACHE_TTL)
+    return True
+
+
+def are_urls_accessible(*urls):
+    """Ověří všechny URL souběžně a vrátí True, jen pokud jsou dostupné všechny."""
+    started = time.monotonic()
+    results = list(_get_probe_executor().map(is_url_accessible, urls))
+    elapsed_ms = (time.monotonic() - started) * 1000
+    logger.info(f"tryon.probe duration_ms={elapsed_ms:.1f} urls={len(urls)} ok={all(results)}")
+    return all(results)
+
+
+def build_input_data(product, human_img):
+    return {
+        "garm_img": product.tryon_image_url,
+        "human_img": human_img,
+        "garment_des": product.clothing_type,
+        "category": product.clothing_type
+    }
+
+
+def get_replicate_client():
+    return replicate.Client(api_token=settings.REPLICATE_API_TOKEN)
+
+
+def run_model(input_data, on_progress=None):
+    """
+    Spustí idm-vton na Replicate a vrátí URL vygenerovaného obrázku.
+
+    `on_progress(prediction)` se volá pokaždé, když Replicate vrátí nové logy.
+    """
+    if not are_urls_accessible(input_data["garm_img"], input_data["human_img"]):
+        raise InputNotAccessible("Invalid or inaccessible URL: URL is not accessible")
+
+    logger.info("Running Replicate model")
+    client = get_replicate_client()
+    version_id = settings.TRYON_MODEL_VERSION.split(':')[-1]
+    prediction = client.predictions.create(version=version_id, input=input_data)
+
+    last_logs = None
+    while prediction.status not in ('succeeded', 'failed', 'canceled'):
+        time.sleep(client.poll_interval)
+        prediction.reload()
+        if on_progress and prediction.logs != last_logs:
+            last_logs = prediction.logs
+            on_progress(prediction)
+
+    if prediction.status != 'succeeded':
+        raise TryOnError(f"Replicate prediction {prediction.status}: {prediction.error}")
+
+    logger.info(f"Replicate output: {prediction.output}")
+    return prediction.output
+
+
+def store_result_image(output_url, user_id, product_id):
+    """Přenese výstup z Replicate do storage (streamovaně) a vrátí cestu k souboru."""
+    file_name = f"tryon_{user_id}_{product_id}_{int(time.time())}.jpg"
+    try:
+        file_path = copy_url_to_storage(output_url, f'tryon_results/{file_name}')
+    except (RemoteFileError, requests.RequestException) as e:
+        logger.warning(f"Failed to download image from API: {e}")
+        raise TryOnError("Failed to download image from API")
+    return file_path
+
+
+# Async varianty pro ASGI view - sdílí jeden httpx.AsyncClient na event loop
+
+
+def get_async_http_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.TRYON_PROBE_TIMEOUT, read=60),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+            follow_redirects=True,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def ais_url_accessible(url):
+    if bucket_key_from_url(url):
+        return True
+
+    cache_key = _reachable_cache_key(url)
+    if await cache.aget(cache_key):
+        return True
+
+    try:
+        response = await get_async_http_client().head(url, timeout=settings.TRYON_PROBE_TIMEOUT)
+    except httpx.HTTPError as e:
+        logger.warning(f"URL accessibility check failed for {url}: {e}")
+        return False
+
+    if response.status_code != 200:
+        logger.warning(f"URL accessibility check failed for {url}: status {response.status_code}")
+        return False
+
+    await cache.aset(cache_key, True, settings.TRYON_PROBE_CACHE_TTL)
+    return True
+
+
+async def aare_urls_accessible(*urls):
+    started = time.monotonic()
+    results = await asyncio.gather(*(ais_url_accessible(url) for url in urls))
+    elapsed_ms = (time.monotonic() - started) * 1000
+    logger.info(f"tryon.probe duration_ms={elapsed_ms:.1f} urls={len(urls)} ok={all(results)}")
+    return all(results)
+
+
+async def arun_model(input_data, on_progress=None):
+    """Async obdoba run_model(); `on_progress` je coroutine funkce."""
+    if not await aare_urls_accessible(input_data["garm_img"], input_data["human_img"]):
+        raise InputNotAccessible("Invalid or inaccessible URL: URL is not accessible")
+
+    logger.info("Running Replicate model (async)")
+    client = get_replicate_client()
+    version_id = settings.TRYON_MODEL_VERSION.split(':')[-1]
+    prediction = await client.predictions.async_create(version=version_id, input=input_data)
+
+    last_logs = None
+    while prediction.status not in ('succeeded', 'failed', 'canceled'):
+        await asyncio.sleep(client.poll_interval)
+        await prediction.async_reload()
+        if on_progress and prediction.logs != last_logs:
+            last_logs = prediction.logs
+            await on_progress(prediction)
+
+    if prediction.status != 'succeeded':
+        raise TryOnError(f"Replicate prediction {prediction.status}: {prediction.error}")
+
+    logger.info(f"Replicate output: {prediction.output}")
+    return prediction.output
+
+
+async def astore_result_image(output_url, user_id, product_id):
+    """
+    Stáhne výstup přes sdílený httpx klient do SpooledTemporaryFile (nad 1 MB
+    se přelévá na disk) a teprve pak ho v threadpoolu nahraje do storage.
+    """
+    file_name = f"tryon_{user_id}_{product_id}_{int(time.time())}.jpg"
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as buffer:
+        try:
+            async with get_async_http_client().stream('GET', output_url) as response:
+                if response.status_code != 200:
+                    raise TryOnError("Failed to download image from API")
+                async for chunk in response.aiter_bytes():
+                    buffer.write(chunk)
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to download image from API: {e}")
+            raise TryOnError("Failed to download image from API")
+
+        buffer.seek(0)
+        return await sync_to_async(default_storage.save)(f'tryon_results/{file_name}', File(buffer, name=file_name))
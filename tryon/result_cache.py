@@ -0,0 +1,110 @@
+import hashlib
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from .models import TryOnCacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+HITS_COUNTER_KEY = 'tryon:result_cache:hits'
+MISSES_COUNTER_KEY = 'tryon:result_cache:misses'
+
+
+def make_key(garment_image, human_image, model_version, category):
+    """Content-addressed klíč výsledku: stejné vstupy modelu dají stejný obrázek."""
+    raw = '\n'.join([garment_image, human_image, model_version, category])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def key_for(product, human_image):
+    return make_key(product.tryon_image_url, human_image, settings.TRYON_MODEL_VERSION, product.clothing_type)
+
+
+def _incr(counter_key):
+    try:
+        cache.incr(counter_key)
+    except ValueError:
+        cache.set(counter_key, 1, timeout=None)
+
+
+def lookup(product, human_image):
+    """Vrátí platný záznam cache pro daný vstup, nebo None."""
+    key = key_for(product, human_image)
+    entry = TryOnCacheEntry.objects.filter(key=key).first()
+
+    if entry and entry.created_at < timezone.now() - timedelta(seconds=settings.TRYON_CACHE_MAX_AGE):
+        logger.info(f"Try-on cache entry {key[:12]} expired")
+        entry.delete()
+        entry = None
+
+    if entry is None:
+        _incr(MISSES_COUNTER_KEY)
+        return None
+
+    TryOnCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    _incr(HITS_COUNTER_KEY)
+    logger.info(f"Try-on cache hit {key[:12]} for product {product.id}")
+    return entry
+
+
+def store(product, human_image, result_image):
+    TryOnCacheEntry.objects.update_or_create(
+        key=key_for(product, human_image),
+        defaults={
+            'product': product,
+            'human_image': human_image,
+            'model_version': settings.TRYON_MODEL_VERSION,
+            'category': product.clothing_type,
+            'result_image': result_image,
+            'last_used_at': timezone.now(),
+        }
+    )
+
+
+def invalidate_product(product_id):
+    deleted, _ = TryOnCacheEntry.objects.filter(product_id=product_id).delete()
+    if deleted:
+        logger.info(f"Invalidated {deleted} try-on cache entries for product {product_id}")
+
+
+def invalidate_human_image(human_image):
+    deleted, _ = TryOnCacheEntry.objects.filter(human_image=human_image).delete()
+    if deleted:
+        logger.info(f"Invalidated {deleted} try-on cache entries for profile image {human_image}")
+
+
+def invalidate_result_image(result_image):
+    TryOnCacheEntry.objects.filter(result_image=result_image).delete()
+
+
+def evict():
+    """Smaže záznamy starší než TRYON_CACHE_MAX_AGE a nejdéle nepoužité nad TRYON_CACHE_MAX_ENTRIES."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TRYON_CACHE_MAX_AGE)
+    expired, _ = TryOnCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+
+    lru = 0
+    boundary = (
+        TryOnCacheEntry.objects.order_by('-last_used_at')
+        .values_list('last_used_at', flat=True)[settings.TRYON_CACHE_MAX_ENTRIES:settings.TRYON_CACHE_MAX_ENTRIES + 1]
+    )
+    if boundary:
+        lru, _ = TryOnCacheEntry.objects.filter(last_used_at__lte=boundary[0]).delete()
+
+    logger.info(f"Try-on cache eviction: {expired} expired, {lru} least recently used")
+    return expired + lru
+
+
+def stats():
+    hits = cache.get(HITS_COUNTER_KEY, 0)
+    misses = cache.get(MISSES_COUNTER_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+        'entries': TryOnCacheEntry.objects.count(),
+    }
@@ -1,8 +1,20 @@
 from rest_framework import serializers
-from .models import TryOnResult
+from nandeback.sparse import CachedFieldsMixin
+from .models import TryOnResult, TryOnJob
 
-class TryOnResultSerializer(serializers.ModelSerializer):
+# Pole pro seznam výsledků v aplikaci (?compact=1)
+TRY_ON_RESULT_COMPACT_FIELDS = ['id', 'product', 'thumbnail_image', 'medium_image', 'created_at']
+
+class TryOnResultSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = TryOnResult
-        fields = ['id', 'user', 'product', 'result_image', 'created_at']
-        read_only_fields = ['user']
\ No newline at end of file
+        fields = ['id', 'user', 'product', 'result_image', 'webp_image', 'medium_image', 'thumbnail_image', 'created_at']
+        read_only_fields = ['user', 'webp_image', 'medium_image', 'thumbnail_image']
+
+class TryOnJobSerializer(serializers.ModelSerializer):
+    result = TryOnResultSerializer(read_only=True)
+
+    class Meta:
+        model = TryOnJob
+        fields = ['id', 'product', 'status', 'progress', 'error', 'result', 'created_at', 'updated_at']
+        read_only_fields = fields
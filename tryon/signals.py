@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from shop.models import Product
+from shop.popularity import record_try_ons
+from . import result_cache
+from .events import publish_job_state
+from .models import TryOnJob, TryOnResult
+
+
+@receiver(pre_save, sender=Product)
+def invalidate_try_on_cache_on_image_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or (update_fields is not None and 'image_url' not in update_fields):
+        return
+    # Stejná detekce změny jako v Product.save (URL načtená z DB), bez dalšího dotazu
+    if instance.image_url != getattr(instance, '_loaded_image_url', None):
+        result_cache.invalidate_product(instance.pk)
+
+
+@receiver(post_save, sender=TryOnResult)
+def count_try_on(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    record_try_ons([instance.product_id], 1)
+
+
+@receiver(post_delete, sender=TryOnResult)
+def uncount_try_on(sender, instance, **kwargs):
+    record_try_ons([instance.product_id], -1)
+
+
+@receiver(post_save, sender=TryOnJob)
+def publish_try_on_job_state(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: publish_job_state(instance))
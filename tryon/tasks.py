@@ -0,0 +1,122 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import replicate
+from celery import shared_task
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from nandeback import imaging
+from . import result_cache
+from .models import TryOnJob, TryOnResult
+from .pipeline import TryOnError, build_input_data, run_model, store_result_image
+
+
+logger = logging.getLogger(__name__)
+
+# (pole TryOnResult, přípona souboru, maximální rozměr, kvalita WebP)
+RESULT_IMAGE_VARIANTS = [
+    ('webp_image', '', None, 85),
+    ('medium_image', '_medium', (512, 683), 80),
+    ('thumbnail_image', '_thumb', (192, 256), 75),
+]
+
+
+@shared_task
+def run_try_on_job(job_id):
+    try:
+        job = TryOnJob.objects.select_related('user', 'product').get(pk=job_id)
+    except TryOnJob.DoesNotExist:
+        logger.warning(f"Try-on job {job_id} not found")
+        return
+
+    if job.is_finished:
+        logger.info(f"Try-on job {job_id} already finished with status {job.status}")
+        return
+
+    job.set_status(TryOnJob.STATUS_RUNNING)
+    try:
+        input_data = build_input_data(job.product, job.human_image)
+        logger.info(f"Input data for job {job_id}: {input_data}")
+        output = run_model(input_data, on_progress=lambda prediction: _record_progress(job, prediction))
+
+        job.set_status(TryOnJob.STATUS_UPLOADING)
+        file_path = store_result_image(output, job.user_id, job.product_id)
+
+        complete_job(job, file_path)
+        logger.info(f"Try-on job {job_id} finished: {file_path}")
+    except TryOnError as e:
+        logger.warning(f"Try-on job {job_id} failed: {str(e)}")
+        job.fail(str(e))
+    except replicate.exceptions.ReplicateError as e:
+        logger.error(f"Replicate API error in job {job_id}: {str(e)}", exc_info=True)
+        job.fail(f"Replicate API error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error in job {job_id}: {str(e)}", exc_info=True)
+        job.fail("An unexpected error occurred.")
+
+
+@transaction.atomic
+def complete_job(job, file_path):
+    """Zapíše výsledek hotového jobu, uloží ho do cache výsledků a naplánuje post-processing."""
+    file_url = default_storage.url(file_path)
+    try_on_result = TryOnResult.objects.create(
+        user=job.user,
+        product=job.product,
+        result_image=file_url
+    )
+    result_cache.store(job.product, job.human_image, file_url)
+    job.set_status(TryOnJob.STATUS_DONE, result=try_on_result)
+    transaction.on_commit(lambda: postprocess_try_on_result.delay(file_path))
+    return try_on_result
+
+
+@shared_task
+def postprocess_try_on_result(file_path):
+    """Z originálu vyrobí WebP master a menší varianty pro seznamy výsledků."""
+    with default_storage.open(file_path, 'rb') as original:
+        image = imaging.flatten(imaging.open_image(original))
+
+    base_name = os.path.splitext(file_path)[0]
+    variant_urls = {}
+    variant_names = []
+    for field, suffix, max_size, quality in RESULT_IMAGE_VARIANTS:
+        variant = imaging.resize_to_fit(image, max_size) if max_size else image
+        name = default_storage.save(f'{base_name}{suffix}.webp', imaging.encode(variant, 'WEBP', quality))
+        variant_names.append(name)
+        variant_urls[field] = default_storage.url(name)
+
+    # Varianty dostanou i výsledky z cache, které sdílejí stejný originál
+    updated = TryOnResult.objects.filter(result_image=default_storage.url(file_path)).update(**variant_urls)
+    if not updated:
+        # Výsledek mezitím smazali - varianty by zůstaly v bucketu bez vlastníka
+        for name in variant_names:
+            default_storage.delete(name)
+    logger.info(f"Post-processed {file_path} into {len(variant_urls)} variants for {updated} results")
+
+
+def _record_progress(job, prediction):
+    progress = prediction.progress
+    job.progress = round(progress.percentage * 100) if progress else job.progress
+    job.logs = prediction.logs or ''
+    job.save(update_fields=['progress', 'logs', 'updated_at'])
+
+
+def _run_job_in_thread(job_id):
+    try:
+        run_try_on_job(job_id)
+    finally:
+        connection.close()
+
+
+@shared_task
+def run_try_on_batch(job_ids):
+    """Zpracuje joby jedné dávky souběžně, nejvýše TRYON_BATCH_CONCURRENCY najednou."""
+    logger.info(f"Running try-on batch of {len(job_ids)} jobs")
+    with ThreadPoolExecutor(max_workers=settings.TRYON_BATCH_CONCURRENCY, thread_name_prefix='tryon-batch') as executor:
+        list(executor.map(_run_job_in_thread, job_ids))
+
+
+@shared_task
+def evict_try_on_cache():
+    return result_cache.evict()
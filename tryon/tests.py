@@ -1,3 +1,202 @@
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from shop.models import Product
+from user.models import CustomUser
+from . import result_cache
+from .models import TryOnCacheEntry, TryOnJob, TryOnResult
+from .pipeline import TryOnError
+from .tasks import run_try_on_job
 
-# Create your tests here.
+HUMAN_IMAGE = 'https://bucket.s3.amazonaws.com/profile_images/human.jpg'
+
+
+def create_product(index=0):
+    return Product.objects.create(
+        name=f'Product {index}',
+        store_link=f'https://shop.example.com/{index}',
+        image_url=f'https://shop.example.com/{index}.jpg',
+        clothing_category='top',
+    )
+
+
+class TryOnTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(
+            username='tryon', email='tryon@example.com', profile_images=[HUMAN_IMAGE]
+        )
+        CustomUser.objects.filter(pk=self.user.pk).update(virtual_try_ons_remaining=3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def credits(self):
+        self.user.refresh_from_db(fields=['virtual_try_ons_remaining'])
+        return self.user.virtual_try_ons_remaining
+
+
+class TryOnJobTests(TryOnTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product()
+
+    @mock.patch('tryon.views.run_try_on_job.delay')
+    def test_creates_queued_job(self, delay):
+        response = self.client.post('/tryon/try-on/', {'product_id': self.product.pk}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        job = TryOnJob.objects.get()
+        self.assertEqual((job.status, job.product, job.human_image), (TryOnJob.STATUS_QUEUED, self.product, HUMAN_IMAGE))
+        delay.assert_called_once_with(job.id)
+        self.assertTrue(response.data['status_url'].endswith(f'/tryon/jobs/{job.id}/'))
+        self.assertTrue(response.data['events_url'].endswith(f'/tryon/jobs/{job.id}/events/'))
+
+    @mock.patch('tryon.views.run_try_on_job.delay')
+    def test_cache_hit_returns_finished_job(self, delay):
+        cached_image = 'https://bucket.s3.amazonaws.com/tryon_results/cached.png'
+        result_cache.store(self.product, HUMAN_IMAGE, cached_image)
+        TryOnResult.objects.create(
+            user=self.user, product=self.product, result_image=cached_image, thumbnail_image='https://bucket.s3.amazonaws.com/thumb.webp'
+        )
+
+        response = self.client.post('/tryon/try-on/', {'product_id': self.product.pk}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        delay.assert_not_called()
+        job = TryOnJob.objects.get()
+        self.assertEqual(job.status, TryOnJob.STATUS_DONE)
+        self.assertEqual(job.result.result_image, cached_image)
+        self.assertEqual(job.result.thumbnail_image, 'https://bucket.s3.amazonaws.com/thumb.webp')
+        self.assertEqual(TryOnCacheEntry.objects.get().hits, 1)
+
+    def test_job_status_is_returned_without_waiting(self):
+        job = TryOnJob.objects.create(user=self.user, product=self.product, human_image=HUMAN_IMAGE)
+        with mock.patch('time.sleep', side_effect=AssertionError('get_try_on_job must not block')):
+            response = self.client.get(f'/tryon/jobs/{job.id}/?wait=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], TryOnJob.STATUS_QUEUED)
+
+    def test_other_users_job_is_not_found(self):
+        other = CustomUser.objects.create(username='other', email='other@example.com')
+        job = TryOnJob.objects.create(user=other, product=self.product, human_image=HUMAN_IMAGE)
+        self.assertEqual(self.client.get(f'/tryon/jobs/{job.id}/').status_code, 404)
+
+    @mock.patch('tryon.tasks.store_result_image', return_value='tryon_results/out.png')
+    @mock.patch('tryon.tasks.run_model', return_value='https://replicate.delivery/out.png')
+    def test_job_completes_and_fills_cache(self, run_model, store_result_image):
+        job = TryOnJob.objects.create(user=self.user, product=self.product, human_image=HUMAN_IMAGE, charged=True)
+
+        run_try_on_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, TryOnJob.STATUS_DONE)
+        self.assertTrue(job.result.result_image.endswith('tryon_results/out.png'))
+        self.assertEqual(result_cache.lookup(self.product, HUMAN_IMAGE).result_image, job.result.result_image)
+        self.assertTrue(job.charged)
+
+    @mock.patch('tryon.tasks.run_model', side_effect=TryOnError('Model failed'))
+    def test_failed_job_refunds_credit_once(self, run_model):
+        job = TryOnJob.objects.create(user=self.user, product=self.product, human_image=HUMAN_IMAGE, charged=True)
+
+        run_try_on_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.charged), (TryOnJob.STATUS_FAILED, 'Model failed', False))
+        self.assertEqual(self.credits(), 4)
+        job.fail('Retried failure')
+        self.assertEqual(self.credits(), 4)
+
+    @mock.patch('tryon.tasks.run_model', side_effect=TryOnError('Model failed'))
+    def test_uncharged_job_is_not_refunded(self, run_model):
+        job = TryOnJob.objects.create(user=self.user, product=self.product, human_image=HUMAN_IMAGE)
+        run_try_on_job(job.id)
+        self.assertEqual(self.credits(), 3)
+
+
+class TryOnBatchTests(TryOnTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [create_product(i) for i in range(3)]
+
+    def post_batch(self, products):
+        with mock.patch('tryon.views.run_try_on_batch.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/tryon/batch/', {'product_ids': [product.pk for product in products]}, format='json')
+        return response, delay
+
+    def test_charges_whole_batch_up_front(self):
+        response, delay = self.post_batch(self.products[:2])
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['virtual_try_ons_remaining'], 1)
+        self.assertEqual(self.credits(), 1)
+        jobs = TryOnJob.objects.order_by('id')
+        self.assertTrue(all(job.charged and job.status == TryOnJob.STATUS_QUEUED for job in jobs))
+        delay.assert_called_once_with([job.id for job in jobs])
+
+    def test_not_enough_credits_charges_nothing(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(virtual_try_ons_remaining=2)
+
+        response, delay = self.post_batch(self.products)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.credits(), 2)
+        self.assertFalse(TryOnJob.objects.exists())
+        delay.assert_not_called()
+
+    def test_partial_failure_refunds_failed_items(self):
+        self.post_batch(self.products[:2])
+        succeeded, failed = TryOnJob.objects.order_by('id')
+
+        with mock.patch('tryon.tasks.store_result_image', return_value='tryon_results/out.png'), \
+             mock.patch('tryon.tasks.run_model', side_effect=['https://replicate.delivery/out.png', TryOnError('Model failed')]):
+            run_try_on_job(succeeded.id)
+            run_try_on_job(failed.id)
+
+        succeeded.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual((succeeded.status, succeeded.charged), (TryOnJob.STATUS_DONE, True))
+        self.assertEqual((failed.status, failed.charged), (TryOnJob.STATUS_FAILED, False))
+        self.assertEqual(self.credits(), 2)
+
+    def test_cached_items_are_charged_but_not_queued(self):
+        cached_image = 'https://bucket.s3.amazonaws.com/tryon_results/cached.png'
+        result_cache.store(self.products[0], HUMAN_IMAGE, cached_image)
+
+        response, delay = self.post_batch(self.products[:2])
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.credits(), 1)
+        cached, queued = TryOnJob.objects.order_by('id')
+        self.assertEqual(cached.status, TryOnJob.STATUS_DONE)
+        delay.assert_called_once_with([queued.id])
+
+    def test_missing_product_charges_nothing(self):
+        response = self.client.post('/tryon/batch/', {'product_ids': [self.products[0].pk, 999999]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['missing_product_ids'], [999999])
+        self.assertEqual(self.credits(), 3)
+
+
+class TryOnCacheInvalidationTests(TestCase):
+    def setUp(self):
+        self.product = create_product()
+        result_cache.store(self.product, HUMAN_IMAGE, 'https://bucket.s3.amazonaws.com/tryon_results/cached.png')
+
+    def test_image_change_invalidates_cached_results(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.image_url = 'https://shop.example.com/new.jpg'
+        product.save()
+        self.assertFalse(TryOnCacheEntry.objects.exists())
+
+    def test_other_changes_keep_cache_without_extra_query(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = 'Renamed'
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        product.save(update_fields=['name'])
+        self.assertTrue(TryOnCacheEntry.objects.exists())
+        self.assertFalse([query['sql'] for query in queries if query['sql'].startswith('SELECT "shop_product"."image_url"')])
@@ -1,8 +1,13 @@
 from django.urls import path
-from .views import try_on, get_user_try_on_results, delete_try_on_result
+from .views import try_on, try_on_async, try_on_batch, get_try_on_job, try_on_job_events, get_user_try_on_results, delete_try_on_result, get_try_on_cache_stats
 
 urlpatterns = [
     path('try-on/', try_on, name='try-on'),
+    path('try-on-async/', try_on_async, name='try-on-async'),
+    path('batch/', try_on_batch, name='try-on-batch'),
+    path('jobs/<int:job_id>/', get_try_on_job, name='try-on-job'),
+    path('jobs/<int:job_id>/events/', try_on_job_events, name='try-on-job-events'),
     path('results/', get_user_try_on_results, name='user-try-on-results'),
     path('delete-result/<int:result_id>/', delete_try_on_result, name='delete-try-on-result'),
-]
\ No newline at end of file
+    path('cache-stats/', get_try_on_cache_stats, name='try-on-cache-stats'),
+]
@@ -1,34 +1,37 @@
-import os
-import replicate
+import asyncio
+import json
 import logging
-import requests
-import time
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .models import TryOnResult
-from .serializers import TryOnResultSerializer
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from . import result_cache
+from .events import load_job_state
+from .models import TryOnResult, TryOnJob
+from .serializers import TRY_ON_RESULT_COMPACT_FIELDS, TryOnResultSerializer, TryOnJobSerializer
+from .pipeline import InputNotAccessible, TryOnError, build_input_data, arun_model, astore_result_image
+from .tasks import RESULT_IMAGE_VARIANTS, run_try_on_job, run_try_on_batch, complete_job
+from nandeback.storage import storage_name_from_url
+from nandeback.sparse import model_field_names, requested_fields, sparse_serializer
 from shop.models import Product
+from user.models import CustomUser
 
 
 logger = logging.getLogger(__name__)
 
 
-def is_url_accessible(url, timeout=20):
-    try:
-        response = requests.head(url, timeout=timeout)
-        return response.status_code == 200
-    except requests.RequestException as e:
-        logger.warning(f"URL accessibility check failed for {url}: {e}")
-        return False
-
-
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def try_on(request):
@@ -47,72 +50,311 @@ def try_on(request):
         logger.warning(f"Product with ID {product_id} not found")
         return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
    
-    os.environ["REPLICATE_API_TOKEN"] = "r8_dgVuU2aOUvNUTxWDNf1RH5vqjREXCqb2tPRHW"
-   
     user_profile_image_url = request.user.active_profile_image
     if not user_profile_image_url:
         logger.warning(f"User {request.user.username} does not have an active profile image")
         return Response({"error": "User does not have an active profile image."}, status=status.HTTP_400_BAD_REQUEST)
-   
-    input_data = {
-        "garm_img": product.image_url,
-        "human_img": user_profile_image_url,
-        "garment_des": product.clothing_type,
-        "category": product.clothing_type
-    }
-    logger.info(f"Input data: {input_data}")
 
     validate_url = URLValidator()
     try:
-        validate_url(input_data["garm_img"])
-        validate_url(input_data["human_img"])
-        if not is_url_accessible(input_data["garm_img"]) or not is_url_accessible(input_data["human_img"]):
-            raise ValidationError("URL is not accessible")
+        validate_url(product.image_url)
+        validate_url(user_profile_image_url)
     except ValidationError as e:
-        logger.warning(f"Invalid or inaccessible URL: {str(e)}")
+        logger.warning(f"Invalid URL: {str(e)}")
         return Response({"error": f"Invalid or inaccessible URL: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-   
+
+    job = _create_job(request.user, product, user_profile_image_url)
+    if job.status == TryOnJob.STATUS_QUEUED:
+        run_try_on_job.delay(job.id)
+        logger.info(f"Queued try-on job {job.id}")
+        return Response(_job_data(request, job), status=status.HTTP_202_ACCEPTED)
+    return Response(_job_data(request, job), status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def try_on_batch(request):
+    logger.info("Received batch try-on request")
+    product_ids = request.data.get('product_ids')
+
+    if not isinstance(product_ids, list) or not product_ids:
+        return Response({"error": "product_ids must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        product_ids = list(dict.fromkeys(int(product_id) for product_id in product_ids))
+    except (TypeError, ValueError):
+        return Response({"error": "product_ids must contain integers."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(product_ids) > settings.TRYON_BATCH_MAX_ITEMS:
+        return Response({"error": f"At most {settings.TRYON_BATCH_MAX_ITEMS} products per batch."}, status=status.HTTP_400_BAD_REQUEST)
+
+    products = Product.objects.in_bulk(product_ids)
+    missing = [product_id for product_id in product_ids if product_id not in products]
+    if missing:
+        logger.warning(f"Products not found for batch: {missing}")
+        return Response({"error": "Product not found.", "missing_product_ids": missing}, status=status.HTTP_404_NOT_FOUND)
+
+    user = request.user
+    user_profile_image_url = user.active_profile_image
+    if not user_profile_image_url:
+        logger.warning(f"User {user.username} does not have an active profile image")
+        return Response({"error": "User does not have an active profile image."}, status=status.HTTP_400_BAD_REQUEST)
+
+    validate_url = URLValidator()
     try:
-        logger.info("Running Replicate model")
-        output = replicate.run(
-            "cuuupid/idm-vton:906425dbca90663ff5427624839572cc56ea7d380343d13e2a4c4b09d3f0c30f",
-            input=input_data
+        validate_url(user_profile_image_url)
+        for product in products.values():
+            validate_url(product.image_url)
+    except ValidationError as e:
+        logger.warning(f"Invalid URL: {str(e)}")
+        return Response({"error": f"Invalid or inaccessible URL: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not user.is_subscription_active:
+        return Response({"error": "Your subscription is not active"}, status=status.HTTP_403_FORBIDDEN)
+
+    with transaction.atomic():
+        # Strhneme kredity za celou dávku jedním podmíněným UPDATE - buď vše, nebo nic
+        charged = CustomUser.objects.filter(
+            pk=user.pk, virtual_try_ons_remaining__gte=len(product_ids)
+        ).update(virtual_try_ons_remaining=F('virtual_try_ons_remaining') - len(product_ids))
+        if not charged:
+            return Response({"error": "Not enough virtual try-ons remaining."}, status=status.HTTP_403_FORBIDDEN)
+
+        jobs = [
+            _create_job(user, products[product_id], user_profile_image_url, charged=True)
+            for product_id in product_ids
+        ]
+        queued_ids = [job.id for job in jobs if job.status == TryOnJob.STATUS_QUEUED]
+        if queued_ids:
+            transaction.on_commit(lambda: run_try_on_batch.delay(queued_ids))
+
+    logger.info(f"Batch of {len(jobs)} try-on jobs created, {len(queued_ids)} queued")
+    user.refresh_from_db(fields=['virtual_try_ons_remaining'])
+    return Response({
+        "jobs": [_job_data(request, job) for job in jobs],
+        "virtual_try_ons_remaining": user.virtual_try_ons_remaining,
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+def _create_job(user, product, human_image, charged=False):
+    """Založí try-on job; pokud je výsledek v cache, job je rovnou hotový."""
+    # Stejný oděv na stejné profilové fotce už máme vygenerovaný - vrátíme ho bez inference
+    cached = result_cache.lookup(product, human_image)
+    if cached:
+        variants = (
+            TryOnResult.objects.filter(result_image=cached.result_image)
+            .values('webp_image', 'medium_image', 'thumbnail_image').first()
+        ) or {}
+        try_on_result = TryOnResult.objects.create(
+            user=user,
+            product=product,
+            result_image=cached.result_image,
+            **variants
+        )
+        return TryOnJob.objects.create(
+            user=user,
+            product=product,
+            human_image=human_image,
+            status=TryOnJob.STATUS_DONE,
+            result=try_on_result,
+            charged=charged
         )
-        logger.info(f"Replicate output: {output}")
-       
-        response = requests.get(output)
-        if response.status_code == 200:
-            file_name = f"tryon_{request.user.id}_{product.id}_{int(time.time())}.jpg"
-           
-            file_content = ContentFile(response.content)
-            file_path = default_storage.save(f'tryon_results/{file_name}', file_content)
-           
-            file_url = default_storage.url(file_path)
-           
-            try_on_result = TryOnResult.objects.create(
-                user=request.user,
-                product=product,
-                result_image=file_url
-            )
-           
-            serializer = TryOnResultSerializer(try_on_result)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            return Response({"error": "Failed to download image from API"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except replicate.exceptions.ReplicateError as e:
-        logger.error(f"Replicate API error: {str(e)}", exc_info=True)
-        return Response({"error": f"Replicate API error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
-        return Response({"error": "An unexpected error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # Samotná inference běží v Celery workeru, request jen založí job
+    return TryOnJob.objects.create(
+        user=user,
+        product=product,
+        human_image=human_image,
+        charged=charged
+    )
+
+
+def _job_data(request, job):
+    data = TryOnJobSerializer(job).data
+    data['status_url'] = request.build_absolute_uri(reverse('try-on-job', args=[job.id]))
+    data['events_url'] = request.build_absolute_uri(reverse('try-on-job-events', args=[job.id]))
+    return data
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_try_on_job(request, job_id):
+    """
+    Aktuální stav jobu, odpověď se nedrží. Na změny klient čeká přes SSE
+    (events_url), kde čekání nedrží vlákno workeru ani spojení do DB.
+    """
+    try:
+        job = TryOnJob.objects.select_related('result').get(id=job_id, user=request.user)
+    except TryOnJob.DoesNotExist:
+        return Response({"error": "Try-on job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response(TryOnJobSerializer(job).data)
+
+
+@csrf_exempt
+async def try_on_async(request):
+    """
+    Async varianta try_on pro ASGI: inference běží přímo v requestu, ale čekání
+    na Replicate a stahování výsledku drží jen coroutine, ne vlákno.
+
+    Request trvá desítky sekund, proto během inference nedrží spojení do DB:
+    otevřené se zavře před voláním modelu a každý další zápis (průběh, stav,
+    výsledek) si ho otevře a hned zavře (_closing). Jinak by stovky běžících
+    generování vyčerpaly spojení Postgresu.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    user = await _aget_token_user(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        data = json.loads(request.body) if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+
+    product_id = data.get('product_id')
+    logger.info(f"Received async try-on request, product ID: {product_id}")
+    if not product_id:
+        return JsonResponse({"error": "Product ID is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        product = await Product.objects.aget(id=product_id)
+    except (Product.DoesNotExist, ValueError):
+        logger.warning(f"Product with ID {product_id} not found")
+        return JsonResponse({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    user_profile_image_url = user.active_profile_image
+    if not user_profile_image_url:
+        logger.warning(f"User {user.username} does not have an active profile image")
+        return JsonResponse({"error": "User does not have an active profile image."}, status=status.HTTP_400_BAD_REQUEST)
+
+    validate_url = URLValidator()
+    try:
+        validate_url(product.image_url)
+        validate_url(user_profile_image_url)
+    except ValidationError as e:
+        logger.warning(f"Invalid URL: {str(e)}")
+        return JsonResponse({"error": f"Invalid or inaccessible URL: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = await _closing(_create_job)(user, product, user_profile_image_url)
+    if job.status == TryOnJob.STATUS_QUEUED:
+        await _closing(job.set_status)(TryOnJob.STATUS_RUNNING)
+
+        async def record_progress(prediction):
+            progress = prediction.progress
+            job.progress = round(progress.percentage * 100) if progress else job.progress
+            job.logs = prediction.logs or ''
+            await _closing(job.save)(update_fields=['progress', 'logs', 'updated_at'])
+
+        try:
+            output = await arun_model(build_input_data(product, user_profile_image_url), on_progress=record_progress)
+            await _closing(job.set_status)(TryOnJob.STATUS_UPLOADING)
+            file_path = await astore_result_image(output, user.id, product.id)
+            await _closing(complete_job)(job, file_path)
+        except InputNotAccessible as e:
+            logger.warning(f"Try-on job {job.id} failed: {str(e)}")
+            await _closing(job.fail)(str(e))
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TryOnError as e:
+            logger.warning(f"Try-on job {job.id} failed: {str(e)}")
+            await _closing(job.fail)(str(e))
+            return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception as e:
+            logger.error(f"Unexpected error in job {job.id}: {str(e)}", exc_info=True)
+            await _closing(job.fail)("An unexpected error occurred.")
+            return JsonResponse({"error": "An unexpected error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return JsonResponse(_job_data(request, job), status=status.HTTP_201_CREATED, encoder=DjangoJSONEncoder)
+
+
+async def try_on_job_events(request, job_id):
+    """
+    Server-sent events se stavem try-on jobu (queued, running, uploading, done, failed)
+    a průběhem z Replicate. Async view - čekající klient nedrží žádné vlákno.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    user = await _aget_token_user(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    if not await TryOnJob.objects.filter(id=job_id, user=user).aexists():
+        return JsonResponse({"error": "Try-on job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # Spojení z ověření tokenu by jinak zůstalo otevřené po celou dobu streamu
+    await sync_to_async(_close_db_connection)()
+
+    response = StreamingHttpResponse(_job_event_stream(job_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _close_db_connection():
+    # Musí běžet ve vlákně requestu (sync_to_async), spojení je per-vlákno
+    connection.close()
+
+
+def _closing(func):
+    """sync_to_async, které po volání zavře spojení do DB (viz try_on_async)."""
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connection.close()
+    return sync_to_async(call)
+
+
+async def _aget_token_user(request):
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=auth[1])
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+async def _job_event_stream(job_id):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.TRYON_EVENTS_MAX_DURATION
+    last_state = None
+    last_sent = loop.time()
+
+    while True:
+        # Stav z cache (do DB jen při miss) ve sdíleném poolu vláken, ne ve vlákně requestu
+        state = await sync_to_async(load_job_state, thread_sensitive=False)(job_id)
+        if state != last_state:
+            last_state = state
+            last_sent = loop.time()
+            yield f"event: {state['status']}\ndata: {json.dumps(state, cls=DjangoJSONEncoder)}\n\n"
+
+        if state['status'] in TryOnJob.FINAL_STATUSES:
+            return
+        if loop.time() >= deadline:
+            yield "event: timeout\ndata: {}\n\n"
+            return
+        if loop.time() - last_sent >= 15:
+            # Komentář udržuje spojení otevřené přes proxy
+            last_sent = loop.time()
+            yield ": keep-alive\n\n"
+
+        await asyncio.sleep(settings.TRYON_EVENTS_POLL_INTERVAL)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_try_on_results(request):
     logger.info(f"Fetching try-on results for user: {request.user.username}")
-    try_on_results = TryOnResult.objects.filter(user=request.user).order_by('-created_at')[:20]  # Omezení na posledních 20 výsledků
-    serializer = TryOnResultSerializer(try_on_results, many=True)
+    try_on_results = TryOnResult.objects.filter(user=request.user).order_by('-created_at')
+    serializer_class = TryOnResultSerializer
+    fields = requested_fields(request.query_params, TryOnResultSerializer.Meta.fields, TRY_ON_RESULT_COMPACT_FIELDS)
+    if fields:
+        serializer_class = sparse_serializer(TryOnResultSerializer, fields)
+        try_on_results = try_on_results.only(*model_field_names(TryOnResult, fields))
+    serializer = serializer_class(try_on_results[:20], many=True)  # Omezení na posledních 20 výsledků
     return Response(serializer.data)
 
 
@@ -123,16 +365,21 @@ def delete_try_on_result(request, result_id):
         result = TryOnResult.objects.get(id=result_id, user=request.user)
         logger.info(f"Found try-on result: {result}")
 
-        # Kontrola, zda existuje soubor k mazání
-        if result.result_image:
-            file_path = result.result_image
-            logger.info(f"File path to delete: {file_path}")
+        # Soubor může sdílet více výsledků z cache - mažeme ho i s variantami až s posledním z nich
+        shared = TryOnResult.objects.filter(result_image=result.result_image).exclude(id=result.id).exists()
+        if result.result_image and not shared:
+            result_cache.invalidate_result_image(result.result_image)
+            for url in [result.result_image] + [getattr(result, field) for field, *_ in RESULT_IMAGE_VARIANTS]:
+                file_path = storage_name_from_url(url) if url else None
+                if file_path is None:
+                    continue
+                logger.info(f"File path to delete: {file_path}")
 
-            if default_storage.exists(file_path):
-                logger.info(f"Deleting file: {file_path}")
-                default_storage.delete(file_path)
-            else:
-                logger.warning(f"File does not exist: {file_path}")
+                if default_storage.exists(file_path):
+                    logger.info(f"Deleting file: {file_path}")
+                    default_storage.delete(file_path)
+                else:
+                    logger.warning(f"File does not exist: {file_path}")
 
         result.delete()
         logger.info(f"Deleted try-on result: {result}")
@@ -147,3 +394,7 @@ def delete_try_on_result(request, result_id):
         return Response({"error": "An unexpected error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_try_on_cache_stats(request):
+    return Response(result_cache.stats())
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
+from .favorites import delete_favorites
 from .models import CustomUser, FavoriteItem
 from django.utils import timezone
 
@@ -58,4 +59,12 @@ class FavoriteItemAdmin(admin.ModelAdmin):
     list_filter = ('user', 'product', 'created_at')
     search_fields = ('user__username', 'product__name')
     date_hierarchy = 'created_at'
-    raw_id_fields = ('user', 'product')
\ No newline at end of file
+    raw_id_fields = ('user', 'product')
+
+    def delete_queryset(self, request, queryset):
+        # Přes delete_favorites, aby se odebrání promítlo do synchronizace v aplikaci
+        by_user = {}
+        for user_id, product_id in queryset.values_list('user_id', 'product_id'):
+            by_user.setdefault(user_id, []).append(product_id)
+        for user_id, product_ids in by_user.items():
+            delete_favorites(user_id, product_ids)
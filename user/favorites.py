@@ -0,0 +1,254 @@
+import time
+from array import array
+from bisect import bisect_left
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max
+from shop.models import Product
+from shop.popularity import record_favorites
+from .models import FavoriteChange, FavoriteItem, FavoriteSyncState
+
+
+MAX_BULK_CHECK_IDS = 200
+MAX_SYNC_OPERATIONS = 500
+SYNC_ACTIONS = {'add': True, 'remove': False}
+
+CACHE_KEY_PREFIX = 'favorites:'
+
+# Id oblíbených produktů se v cache drží jako seřazené pole 64bitových čísel
+# (8 bajtů na položku) pod klíčem s verzí uživatele: favorites:<id>:<verze>.
+# Každý zápis po commitu verzi zvýší (signals.py), takže čtení, které při miss
+# načetlo z DB starý stav, ho uloží pod už neplatnou verzi a nic nepřepíše.
+
+
+def _version_key(user_id):
+    return f'{CACHE_KEY_PREFIX}{user_id}:version'
+
+
+def _favorites_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Nová verze z hodin je větší než jakákoli dřívější, vypršelou nevrátí
+        cache.add(key, time.time_ns(), settings.FAVORITES_CACHE_TTL)
+        version = cache.get(key)
+    return version
+
+
+def _load_favorites(user_id):
+    version = _favorites_version(user_id)
+    key = f'{CACHE_KEY_PREFIX}{user_id}:{version}'
+    ids = cache.get(key)
+    if ids is None:
+        ids = array('q', FavoriteItem.objects.filter(user_id=user_id).order_by('product_id').values_list('product_id', flat=True))
+        cache.add(key, ids, settings.FAVORITES_CACHE_TTL)
+    return version, ids
+
+
+def get_favorite_ids(user_id):
+    """Seřazené pole id oblíbených produktů uživatele."""
+    return _load_favorites(user_id)[1]
+
+
+def contains(ids, product_id):
+    """Binární vyhledání v seřazeném poli z get_favorite_ids."""
+    index = bisect_left(ids, product_id)
+    return index < len(ids) and ids[index] == product_id
+
+
+def invalidate_cached_favorites(user_id):
+    """Zneplatní oblíbené v cache zvýšením verze. Volat po commitu zápisu."""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # Verze v cache není - další čtení založí novou
+        pass
+
+
+def parse_product_ids(value):
+    """
+    Id produktů z ?ids=1,2,3 nebo z JSON seznamu. Duplicity zahodí;
+    nečíselná hodnota nebo víc než MAX_BULK_CHECK_IDS id vyvolá ValueError.
+    """
+    if isinstance(value, str):
+        value = [part for part in value.split(',') if part.strip()]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError('ids must be a list of product ids')
+    try:
+        ids = list(dict.fromkeys(int(product_id) for product_id in value))
+    except (TypeError, ValueError):
+        raise ValueError('ids must be a list of product ids')
+    if len(ids) > MAX_BULK_CHECK_IDS:
+        raise ValueError(f'At most {MAX_BULK_CHECK_IDS} ids can be checked at once')
+    return ids
+
+
+def favorite_product_ids(user_id, product_ids):
+    """Podmnožina `product_ids`, kterou má uživatel v oblíbených (z cache)."""
+    ids = get_favorite_ids(user_id)
+    return {product_id for product_id in product_ids if contains(ids, product_id)}
+
+
+def favorites_state(user_id):
+    """Otisk oblíbených uživatele pro ETag - mění se s každým zápisem."""
+    return str(_favorites_version(user_id))
+
+
+# Synchronizace oblíbených z mobilní aplikace. Každý zápis zvýší verzi
+# uživatele (FavoriteSyncState, zamčená do commitu, takže verze se commitují
+# popořadě) a zaloguje změněné produkty do FavoriteChange. Klient posílá
+# poslední známou verzi a dostane jen produkty změněné od ní.
+
+
+def _lock_sync_state(user_id):
+    state, _ = FavoriteSyncState.objects.select_for_update().get_or_create(user_id=user_id)
+    return state
+
+
+def record_favorite_changes(user_id, product_ids, favorite, state=None):
+    """Zaloguje změny pod novou verzí uživatele. Volat uvnitř transakce zápisu."""
+    product_ids = [int(product_id) for product_id in product_ids]
+    if not product_ids:
+        return
+    with transaction.atomic():
+        state = state or _lock_sync_state(user_id)
+        state.version += 1
+        state.save(update_fields=['version'])
+        FavoriteChange.objects.bulk_create([
+            FavoriteChange(user_id=user_id, product_id=product_id, favorite=favorite, version=state.version)
+            for product_id in product_ids
+        ])
+
+
+def delete_favorites(user_id, product_ids, state=None):
+    """Hromadné odebrání jedním DELETE (signály změny nezapisují, dělá to tato funkce)."""
+    with transaction.atomic():
+        FavoriteItem.objects.filter(user_id=user_id, product_id__in=product_ids).delete()
+        record_favorite_changes(user_id, product_ids, False, state=state)
+        record_favorites(product_ids, -1)
+    transaction.on_commit(lambda: invalidate_cached_favorites(user_id))
+
+
+def record_removed_product(product_id):
+    """
+    Smazaný produkt zaloguje jako odebraný všem, kdo ho měli v oblíbených.
+    Verze všech dotčených uživatelů zvýší jedním UPDATE; samotné řádky
+    FavoriteItem pak smaže kaskáda jedním DELETE. Volat před smazáním produktu.
+    """
+    with transaction.atomic():
+        user_ids = list(FavoriteItem.objects.filter(product_id=product_id).order_by('user_id').values_list('user_id', flat=True))
+        if not user_ids:
+            return
+        FavoriteSyncState.objects.bulk_create([FavoriteSyncState(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        # UPDATE řádky zamkne do commitu, takže přečtené verze jsou naše
+        states = FavoriteSyncState.objects.filter(user_id__in=user_ids)
+        states.update(version=F('version') + 1)
+        FavoriteChange.objects.bulk_create([
+            FavoriteChange(user_id=user_id, product_id=product_id, favorite=False, version=version)
+            for user_id, version in states.values_list('user_id', 'version')
+        ])
+    transaction.on_commit(lambda: [invalidate_cached_favorites(user_id) for user_id in user_ids])
+
+
+def parse_sync_request(data):
+    """
+    Z {"version": 12, "operations": [{"product": 5, "action": "add"}, ...]}
+    vrátí (verze klienta, {product_id: favorite}); pro stejný produkt platí
+    poslední operace. Neplatný požadavek vyvolá ValueError.
+    """
+    try:
+        version = int(data.get('version') or 0)
+    except (TypeError, ValueError):
+        raise ValueError('version must be an integer')
+    operations = data.get('operations') or []
+    if version < 0 or not isinstance(operations, list):
+        raise ValueError('version must be a non-negative integer and operations a list')
+    if len(operations) > MAX_SYNC_OPERATIONS:
+        raise ValueError(f'At most {MAX_SYNC_OPERATIONS} operations can be synced at once')
+
+    wanted = {}
+    for operation in operations:
+        try:
+            wanted[int(operation['product'])] = SYNC_ACTIONS[operation['action']]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Each operation needs a product id and action 'add' or 'remove'")
+    return version, wanted
+
+
+def sync_favorites(user_id, client_version, wanted):
+    """
+    Aplikuje operace klienta v jedné transakci (bulk_create + jeden DELETE)
+    a vrátí změny od `client_version`. Bez verze (0), s neznámou verzí nebo
+    s verzí, jejíž změny už smazala prune_favorite_changes, dostane klient
+    celý seznam (reset).
+    """
+    with transaction.atomic():
+        state = _lock_sync_state(user_id)
+        existing = set(
+            FavoriteItem.objects
+            .filter(user_id=user_id, product_id__in=wanted)
+            .values_list('product_id', flat=True)
+        )
+
+        requested = [product_id for product_id, favorite in wanted.items() if favorite and product_id not in existing]
+        # Neexistující produkty nepřidáme a klientovi je vrátíme jako odebrané
+        added = list(Product.objects.filter(id__in=requested).values_list('id', flat=True)) if requested else []
+        rejected = set(requested) - set(added)
+        if added:
+            FavoriteItem.objects.bulk_create(
+                [FavoriteItem(user_id=user_id, product_id=product_id) for product_id in added],
+                ignore_conflicts=True
+            )
+            record_favorite_changes(user_id, added, True, state=state)
+            record_favorites(added, 1)
+            transaction.on_commit(lambda: invalidate_cached_favorites(user_id))
+
+        removed = [product_id for product_id, favorite in wanted.items() if not favorite and product_id in existing]
+        if removed:
+            delete_favorites(user_id, removed, state=state)
+
+        if client_version == 0 or client_version > state.version or client_version < state.floor_version:
+            favorites = FavoriteItem.objects.filter(user_id=user_id).order_by('product_id').values_list('product_id', flat=True)
+            return {'version': state.version, 'reset': True, 'favorites': list(favorites)}
+
+        changed = set(
+            FavoriteChange.objects
+            .filter(user_id=user_id, version__gt=client_version)
+            .values_list('product_id', flat=True)
+            .distinct()
+        ) | rejected
+        current = set(
+            FavoriteItem.objects
+            .filter(user_id=user_id, product_id__in=changed)
+            .values_list('product_id', flat=True)
+        )
+        return {
+            'version': state.version,
+            'reset': False,
+            'added': sorted(current),
+            'removed': sorted(changed - current),
+        }
+
+
+def prune_favorite_changes(older_than):
+    """
+    Smaže změny starší než `older_than` a posune floor_version uživatele na
+    nejvyšší smazanou verzi. Vrátí počet smazaných záznamů.
+    """
+    pruned = 0
+    floors = (
+        FavoriteChange.objects
+        .filter(created_at__lt=older_than)
+        .values('user_id')
+        .annotate(version=Max('version'))
+        .values_list('user_id', 'version')
+    )
+    for user_id, version in floors.iterator():
+        with transaction.atomic():
+            state = _lock_sync_state(user_id)
+            if version > state.floor_version:
+                state.floor_version = version
+                state.save(update_fields=['floor_version'])
+            pruned += FavoriteChange.objects.filter(user_id=user_id, version__lte=state.floor_version).delete()[0]
+    return pruned
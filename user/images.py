@@ -0,0 +1,22 @@
+from django.conf import settings
+from nandeback import imaging
+
+
+def process_profile_image(fileobj):
+    """
+    Připraví profilovou fotku jako vstup pro idm-vton: otočí ji podle EXIF,
+    zahodí metadata, zmenší na vstupní rozlišení modelu a uloží jako JPEG.
+    """
+    image = imaging.flatten(imaging.open_image(fileobj))
+    image = imaging.resize_to_cover(image, settings.TRYON_INPUT_SIZE)
+    return imaging.encode(image, 'JPEG', quality=90)
+
+
+def profile_image_url(key, query_params=None):
+    url = f'https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com/{key}'
+    if query_params is not None:
+        if 'from_image_detail' in query_params:
+            url += '?from_image_detail=true'
+        elif 'is_new_upload' in query_params:
+            url += '?is_new_upload=true'
+    return url
@@ -12,17 +12,21 @@ class Migration(migrations.Migration):
         ('user', '0001_initial'),
     ]
 
+    # Tabulku už vytváří 0001_initial - tady se model doplní jen do stavu
+    # migrací, aby šla databáze založit od nuly (na existujících DB se nic nemění)
     operations = [
-        migrations.CreateModel(
-            name='FavoriteItem',
-            fields=[
-                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
-                ('created_at', models.DateTimeField(auto_now_add=True)),
-                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product')),
-                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL)),
-            ],
-            options={
-                'unique_together': {('user', 'product')},
-            },
-        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='FavoriteItem',
+                fields=[
+                    ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                    ('created_at', models.DateTimeField(auto_now_add=True)),
+                    ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product')),
+                    ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL)),
+                ],
+                options={
+                    'unique_together': {('user', 'product')},
+                },
+            ),
+        ]),
     ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_product_processed_image_url'),
+        ('user', '0009_customuser_google_play_order_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favoriteitem',
+            index=models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ),
+    ]
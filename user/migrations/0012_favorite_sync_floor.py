@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0011_favoritesyncstate_favoritechange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoritesyncstate',
+            name='floor_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='favoritechange',
+            index=models.Index(fields=['created_at'], name='favorite_change_created_idx'),
+        ),
+    ]
@@ -190,6 +190,32 @@ class FavoriteItem(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            # Seznam oblíbených se čte stránkovaný od nejnovějších
+            models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username}'s favorite: {self.product.name}"
\ No newline at end of file
+        return f"{self.user.username}'s favorite: {self.product.name}"
+
+class FavoriteSyncState(models.Model):
+    """Verze oblíbených uživatele pro /favorites/sync/ - roste s každou změnou."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='favorite_sync_state')
+    version = models.PositiveBigIntegerField(default=0)
+    # Změny do této verze včetně už smazala prune_favorite_changes - starší klient dostane reset
+    floor_version = models.PositiveBigIntegerField(default=0)
+
+class FavoriteChange(models.Model):
+    """Přidání nebo odebrání oblíbeného produktu ve verzi `version`."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='favorite_changes')
+    # Bez FK - záznam o odebrání musí přežít smazání produktu
+    product_id = models.BigIntegerField()
+    favorite = models.BooleanField()
+    version = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'version'], name='favorite_change_version_idx'),
+            models.Index(fields=['created_at'], name='favorite_change_created_idx'),
+        ]
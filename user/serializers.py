@@ -1,5 +1,7 @@
+from functools import lru_cache
 from rest_framework import serializers
 from .models import CustomUser, FavoriteItem
+from nandeback.sparse import CachedFieldsMixin, sparse_serializer
 from shop.serializers import ProductSerializer
 
 class CustomUserSerializer(serializers.ModelSerializer):
@@ -47,7 +49,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
-class FavoriteItemSerializer(serializers.ModelSerializer):
+class FavoriteItemSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
     class Meta:
@@ -55,6 +57,12 @@ class FavoriteItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'created_at']
         read_only_fields = ['user']
 
+@lru_cache(maxsize=64)
+def favorite_item_serializer(product_fields):
+    """FavoriteItemSerializer s vnořeným produktem omezeným na `product_fields`."""
+    product = sparse_serializer(ProductSerializer, product_fields)(read_only=True)
+    return type('FavoriteItemSerializer', (FavoriteItemSerializer,), {'product': product})
+
 class FavoriteItemCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = FavoriteItem
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from shop.models import Product
+from shop.popularity import record_favorites
+from .favorites import invalidate_cached_favorites, record_favorite_changes, record_removed_product
+from .models import CustomUser, FavoriteItem
+
+
+@receiver(post_save, sender=FavoriteItem)
+def add_favorite(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    record_favorite_changes(instance.user_id, [instance.product_id], True)
+    record_favorites([instance.product_id], 1)
+    transaction.on_commit(lambda: invalidate_cached_favorites(instance.user_id))
+
+
+# FavoriteItem záměrně nemá delete receiver - Django by jinak kaskádu ze
+# smazaného produktu či uživatele nemazal jedním DELETE, ale načítal řádek
+# po řádku. Odebrání jde přes delete_favorites, kaskády řeší receivery níže
+# jedním agregovaným zápisem ještě před smazáním.
+
+
+@receiver(pre_delete, sender=Product)
+def remove_deleted_product_from_favorites(sender, instance, **kwargs):
+    record_removed_product(instance.pk)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def release_deleted_user_favorites(sender, instance, **kwargs):
+    # Log změn a verze uživatele zmizí s ním, zbývá jen popularita produktů
+    product_ids = list(FavoriteItem.objects.filter(user_id=instance.pk).values_list('product_id', flat=True))
+    if product_ids:
+        record_favorites(product_ids, -1)
@@ -1,5 +1,53 @@
+import logging
+import tempfile
+from datetime import timedelta
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from nandeback.storage import get_s3_client
+from tryon import result_cache
+from .favorites import prune_favorite_changes
+from .images import process_profile_image
+from .models import CustomUser
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def ingest_profile_image(user_id, s3_file_name, s3_url):
+    """
+    Znormalizuje fotku nahranou přímo do S3 (presigned upload) a přepíše ji
+    pod stejným klíčem jako JPEG. Neplatný obrázek se z bucketu i z profilu odstraní.
+    """
+    bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+    s3 = get_s3_client()
+
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as buffer:
+        s3.download_fileobj(bucket_name, s3_file_name, buffer)
+        buffer.seek(0)
+        try:
+            processed = process_profile_image(buffer)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            logger.warning(f"Uploaded profile image {s3_file_name} is not a valid image: {str(e)}")
+            s3.delete_object(Bucket=bucket_name, Key=s3_file_name)
+            with transaction.atomic():
+                user = CustomUser.objects.select_for_update().filter(pk=user_id).first()
+                if user and s3_url in user.profile_images:
+                    user.profile_images.remove(s3_url)
+                    user.save(update_fields=['profile_images'])
+            return
+
+    s3.upload_fileobj(processed, bucket_name, s3_file_name, ExtraArgs={'ContentType': 'image/jpeg'})
+    # Obsah pod URL se změnil - výsledky spočítané z původní verze už neplatí
+    result_cache.invalidate_human_image(s3_url)
+    logger.info(f"Profile image {s3_file_name} normalized in place")
+
 
 @shared_task
-def add(x, y):
-    return x + y
\ No newline at end of file
+def prune_favorite_sync_log():
+    """Log změn oblíbených drží jen FAVORITE_CHANGE_RETENTION; starší klienti dostanou při synchronizaci reset."""
+    pruned = prune_favorite_changes(timezone.now() - timedelta(seconds=settings.FAVORITE_CHANGE_RETENTION))
+    logger.info(f"Pruned {pruned} favorite changes")
@@ -0,0 +1,365 @@
+from array import array
+from io import BytesIO
+from unittest import mock
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.deletion import Collector
+from django.test import TestCase
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from shop.models import Product
+from .favorites import _favorites_version, delete_favorites, get_favorite_ids, parse_sync_request, prune_favorite_changes, sync_favorites
+from .models import CustomUser, FavoriteChange, FavoriteItem
+from .tasks import ingest_profile_image
+
+
+def create_products(count):
+    skus = Product.allocate_skus(count)
+    return Product.objects.bulk_create([
+        Product(
+            name=f'Product {i}',
+            sku=skus[i],
+            store_link=f'https://shop.example.com/{i}',
+            image_url=f'https://shop.example.com/{i}.jpg',
+            clothing_category='top',
+        )
+        for i in range(count)
+    ])
+
+
+class FavoriteListTests(TestCase):
+    """Seznam oblíbených běží v pevném počtu dotazů bez ohledu na jejich počet."""
+
+    # Verze katalogu (při prázdné cache) a stránka s JOINem na produkt
+    LIST_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(1000)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def favorite_user(self, username, count):
+        user = CustomUser.objects.create(username=username, email=f'{username}@example.com')
+        FavoriteItem.objects.bulk_create([FavoriteItem(user=user, product=product) for product in self.products[:count]])
+        self.client.force_authenticate(user)
+        return user
+
+    def test_query_count_does_not_depend_on_favorites(self):
+        for count in (1, 10, 1000):
+            with self.subTest(count=count):
+                cache.clear()
+                self.favorite_user(f'user{count}', count)
+                for url in ('/favorites/', '/favorites/list_favorites/', '/favorites/?compact=1'):
+                    cache.clear()
+                    with self.assertNumQueries(self.LIST_QUERIES):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), min(count, 50))
+
+    def test_unchanged_list_returns_304(self):
+        self.favorite_user('etag', 10)
+        response = self.client.get('/favorites/')
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/favorites/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/favorites/toggle/', {'product': self.products[0].pk}, format='json')
+        response = self.client.get('/favorites/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class FavoriteCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='cache', email='cache@example.com')
+        self.products = create_products(2)
+
+    def test_write_invalidates_cached_ids(self):
+        self.assertEqual(list(get_favorite_ids(self.user.pk)), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteItem.objects.create(user=self.user, product=self.products[0])
+        self.assertEqual(list(get_favorite_ids(self.user.pk)), [self.products[0].pk])
+
+    def test_stale_rebuild_does_not_outlive_write(self):
+        # Čtení načte z DB starý stav, zápis commitne a teprve pak čtení uloží výsledek do cache
+        version = _favorites_version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteItem.objects.create(user=self.user, product=self.products[0])
+        cache.add(f'favorites:{self.user.pk}:{version}', array('q'))
+        self.assertEqual(list(get_favorite_ids(self.user.pk)), [self.products[0].pk])
+
+
+class ParseSyncRequestTests(TestCase):
+    def test_last_operation_wins(self):
+        version, wanted = parse_sync_request({'version': 3, 'operations': [
+            {'product': 1, 'action': 'add'},
+            {'product': '2', 'action': 'add'},
+            {'product': 1, 'action': 'remove'},
+        ]})
+        self.assertEqual(version, 3)
+        self.assertEqual(wanted, {1: False, 2: True})
+
+    def test_missing_version_means_full_sync(self):
+        self.assertEqual(parse_sync_request({}), (0, {}))
+
+    def test_invalid_requests(self):
+        for data in (
+            {'version': 'abc'},
+            {'version': -1},
+            {'operations': {'product': 1}},
+            {'operations': [{'product': 1, 'action': 'toggle'}]},
+            {'operations': [{'product': 'x', 'action': 'add'}]},
+            {'operations': [{'action': 'add'}]},
+            {'operations': [{'product': i, 'action': 'add'} for i in range(501)]},
+        ):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    parse_sync_request(data)
+
+
+class SyncFavoritesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='sync', email='sync@example.com')
+        self.products = [product.pk for product in create_products(4)]
+
+    def favorites(self):
+        return sorted(FavoriteItem.objects.filter(user=self.user).values_list('product_id', flat=True))
+
+    def test_first_sync_returns_full_list(self):
+        a, b, c, d = self.products
+        result = sync_favorites(self.user.pk, 0, {a: True, b: True})
+        self.assertEqual(result, {'version': 1, 'reset': True, 'favorites': [a, b]})
+        self.assertEqual(self.favorites(), [a, b])
+
+    def test_add_and_remove(self):
+        a, b, c, d = self.products
+        sync_favorites(self.user.pk, 0, {a: True, b: True})
+        # Přidání i odebrání v jedné dávce jsou dvě verze
+        result = sync_favorites(self.user.pk, 1, {a: False, c: True})
+        self.assertEqual(result, {'version': 3, 'reset': False, 'added': [c], 'removed': [a]})
+        self.assertEqual(self.favorites(), [b, c])
+
+    def test_delta_since_client_version(self):
+        a, b, c, d = self.products
+        sync_favorites(self.user.pk, 0, {a: True})
+        FavoriteItem.objects.create(user=self.user, product_id=b)
+        delete_favorites(self.user.pk, [a])
+        # Klient ve verzi 1 neposílá nic a dostane změny z jiných zařízení
+        result = sync_favorites(self.user.pk, 1, {})
+        self.assertEqual(result, {'version': 3, 'reset': False, 'added': [b], 'removed': [a]})
+        self.assertEqual(sync_favorites(self.user.pk, 3, {}), {'version': 3, 'reset': False, 'added': [], 'removed': []})
+
+    def test_repeated_operations_are_idempotent(self):
+        a, b, c, d = self.products
+        sync_favorites(self.user.pk, 0, {a: True})
+        result = sync_favorites(self.user.pk, 1, {a: True, b: False})
+        self.assertEqual(result, {'version': 1, 'reset': False, 'added': [], 'removed': []})
+
+    def test_unknown_products_are_rejected(self):
+        a, b, c, d = self.products
+        missing = max(self.products) + 1000
+        result = sync_favorites(self.user.pk, 0, {a: True})
+        result = sync_favorites(self.user.pk, result['version'], {missing: True, b: True})
+        self.assertEqual(result, {'version': 2, 'reset': False, 'added': [b], 'removed': [missing]})
+        self.assertEqual(self.favorites(), [a, b])
+
+    def test_version_ahead_of_server_resets(self):
+        a, b, c, d = self.products
+        sync_favorites(self.user.pk, 0, {a: True})
+        self.assertTrue(sync_favorites(self.user.pk, 99, {})['reset'])
+
+    def test_version_below_pruned_floor_resets(self):
+        a, b, c, d = self.products
+        sync_favorites(self.user.pk, 0, {a: True})
+        sync_favorites(self.user.pk, 1, {b: True})
+        FavoriteChange.objects.filter(version=1).update(created_at=timezone.now() - timedelta(days=60))
+
+        self.assertEqual(prune_favorite_changes(timezone.now() - timedelta(days=30)), 1)
+        self.assertEqual(self.user.favorite_sync_state.floor_version, 1)
+        self.assertEqual(list(FavoriteChange.objects.values_list('version', flat=True)), [2])
+
+        self.assertEqual(sync_favorites(self.user.pk, 0, {}), {'version': 2, 'reset': True, 'favorites': [a, b]})
+        self.assertEqual(sync_favorites(self.user.pk, 1, {}), {'version': 2, 'reset': False, 'added': [b], 'removed': []})
+        self.assertEqual(prune_favorite_changes(timezone.now() - timedelta(days=30)), 0)
+
+
+class FavoriteDeletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [CustomUser.objects.create(username=f'deleter{i}', email=f'deleter{i}@example.com') for i in range(2)]
+        self.products = create_products(2)
+        for user in self.users:
+            sync_favorites(user.pk, 0, {product.pk: True for product in self.products})
+
+    def test_cascades_delete_favorites_in_bulk(self):
+        # Bez delete signálů na FavoriteItem maže kaskáda jedním DELETE
+        self.assertTrue(Collector(using='default').can_fast_delete(FavoriteItem.objects.all()))
+
+    def test_deleted_product_is_logged_as_removed(self):
+        a, b = self.products
+        for user in self.users:
+            get_favorite_ids(user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=a.pk).delete()
+
+        for user in self.users:
+            self.assertEqual(sync_favorites(user.pk, 1, {}), {'version': 2, 'reset': False, 'added': [], 'removed': [a.pk]})
+            self.assertEqual(list(get_favorite_ids(user.pk)), [b.pk])
+
+    def test_deleted_user_releases_popularity(self):
+        a, b = self.products
+        self.users[0].delete()
+        a.refresh_from_db()
+        self.assertEqual(a.favorite_count, 1)
+        self.assertEqual(FavoriteItem.objects.filter(product=a).count(), 1)
+
+    def test_destroy_and_toggle_log_removal(self):
+        a, b = self.products
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        favorite = FavoriteItem.objects.get(user=self.users[0], product=a)
+        self.assertEqual(client.delete(f'/favorites/{favorite.pk}/').status_code, 204)
+        self.assertEqual(client.post('/favorites/toggle/', {'product': b.pk}, format='json').data, {'is_favorite': False})
+
+        self.assertEqual(sync_favorites(self.users[0].pk, 1, {}), {'version': 3, 'reset': False, 'added': [], 'removed': [a.pk, b.pk]})
+        a.refresh_from_db()
+        self.assertEqual(a.favorite_count, 1)
+
+
+class SyncEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(username='syncapi', email='syncapi@example.com')
+        self.products = [product.pk for product in create_products(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_sync_applies_operations(self):
+        a, b = self.products
+        response = self.client.post('/favorites/sync/', {'operations': [
+            {'product': a, 'action': 'add'},
+            {'product': b, 'action': 'add'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'version': 1, 'reset': True, 'favorites': [a, b]})
+
+        response = self.client.post('/favorites/sync/', {'version': 1, 'operations': [{'product': a, 'action': 'remove'}]}, format='json')
+        self.assertEqual(response.data, {'version': 2, 'reset': False, 'added': [], 'removed': [a]})
+        self.assertEqual(list(FavoriteItem.objects.filter(user=self.user).values_list('product_id', flat=True)), [b])
+
+    def test_invalid_request_is_rejected(self):
+        response = self.client.post('/favorites/sync/', {'operations': [{'product': 1, 'action': 'toggle'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+        self.assertFalse(FavoriteItem.objects.exists())
+
+    def test_requires_authentication(self):
+        response = APIClient().post('/favorites/sync/', {}, format='json')
+        self.assertIn(response.status_code, (401, 403))
+
+
+def image_file(name='photo.png', size=(60, 80), format='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 100, 50)).save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+class ProfileImageUploadTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='owner', email='owner@example.com')
+        self.other = CustomUser.objects.create(username='other', email='other@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.s3 = mock.Mock()
+        self.s3.generate_presigned_post.return_value = {'url': 'https://bucket.s3.amazonaws.com/', 'fields': {'key': 'k'}}
+        self.s3.head_object.return_value = {'ContentType': 'image/jpeg', 'ContentLength': 1024}
+        patcher = mock.patch('user.views.get_s3_client', return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload_token(self, user):
+        response = self.client.post(f'/users/{user.pk}/profile_image_upload_url/', {'content_type': 'image/jpeg'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['upload_token']
+
+    def confirm(self, user, token):
+        with mock.patch('user.views.ingest_profile_image.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/users/{user.pk}/confirm_profile_image_upload/', {'upload_token': token}, format='json')
+        return response, delay
+
+    def test_direct_upload_stores_normalized_jpeg(self):
+        response = self.client.post(f'/users/{self.user.pk}/upload_profile_image/', {'profile_image': image_file()}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        body = self.s3.upload_fileobj.call_args
+        self.assertEqual(body.kwargs['ExtraArgs'], {'ContentType': 'image/jpeg'})
+        self.assertEqual(Image.open(body.args[0]).format, 'JPEG')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_images, [response.data['image_url']])
+
+    def test_direct_upload_rejects_invalid_image(self):
+        invalid = SimpleUploadedFile('photo.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post(f'/users/{self.user.pk}/upload_profile_image/', {'profile_image': invalid}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Invalid image file'})
+        self.s3.upload_fileobj.assert_not_called()
+
+    def test_presigned_upload_is_confirmed(self):
+        response, delay = self.confirm(self.user, self.upload_token(self.user))
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_images, [response.data['image_url']])
+        key = self.s3.head_object.call_args.kwargs['Key']
+        delay.assert_called_once_with(self.user.pk, key, response.data['image_url'])
+
+    def test_unsupported_content_type_is_rejected(self):
+        response = self.client.post(f'/users/{self.user.pk}/profile_image_upload_url/', {'content_type': 'image/gif'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_oversized_or_wrong_type_upload_is_not_confirmed(self):
+        for head in ({'ContentType': 'image/jpeg', 'ContentLength': 10 ** 9}, {'ContentType': 'text/html', 'ContentLength': 10}):
+            with self.subTest(head=head):
+                self.s3.head_object.return_value = head
+                response, delay = self.confirm(self.user, self.upload_token(self.user))
+                self.assertEqual(response.status_code, 400)
+                delay.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_images, [])
+
+    def test_cannot_upload_for_another_user(self):
+        response = self.client.post(f'/users/{self.other.pk}/profile_image_upload_url/', {'content_type': 'image/jpeg'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.s3.generate_presigned_post.assert_not_called()
+
+        # Ani s vlastním platným tokenem nejde potvrdit upload do cizího profilu
+        response, delay = self.confirm(self.other, self.upload_token(self.user))
+        self.assertEqual(response.status_code, 403)
+        delay.assert_not_called()
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.profile_images, [])
+
+    def test_ingest_removes_decompression_bomb(self):
+        url = 'https://bucket.s3.amazonaws.com/profile_images/bomb'
+        CustomUser.objects.filter(pk=self.user.pk).update(profile_images=[url])
+        s3 = mock.Mock()
+        with mock.patch('user.tasks.get_s3_client', return_value=s3), \
+             mock.patch('user.tasks.process_profile_image', side_effect=Image.DecompressionBombError('too many pixels')):
+            ingest_profile_image(self.user.pk, 'profile_images/bomb', url)
+
+        s3.delete_object.assert_called_once_with(Bucket=mock.ANY, Key='profile_images/bomb')
+        s3.upload_fileobj.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_images, [])
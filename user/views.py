@@ -1,9 +1,7 @@
 import os
 import logging
-import boto3
-from botocore.exceptions import NoCredentialsError
+from botocore.exceptions import ClientError, NoCredentialsError
 from django.conf import settings
-import mimetypes
 import uuid
 import secrets
 import json
@@ -27,8 +25,22 @@ from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.core import signing
 from .models import CustomUser, FavoriteItem
-from .serializers import CustomUserSerializer, FavoriteItemSerializer, FavoriteItemCreateSerializer, SubscriptionPlanSerializer
+from .serializers import CustomUserSerializer, FavoriteItemSerializer, FavoriteItemCreateSerializer, SubscriptionPlanSerializer, favorite_item_serializer
+from .favorites import contains, delete_favorites, favorite_product_ids, favorites_state, get_favorite_ids, parse_product_ids, parse_sync_request, sync_favorites
+from .images import process_profile_image, profile_image_url
+from .pagination import FavoriteCursorPagination
+from .tasks import ingest_profile_image
+from tryon import result_cache
+from nandeback import imaging
+from nandeback.sparse import model_field_names, requested_fields
+from nandeback.storage import get_s3_client
+from shop.catalog import catalog_etag, get_catalog_state, normalize_query
+from shop.models import Product
+from shop.serializers import PRODUCT_COMPACT_FIELDS, ProductSerializer
+from PIL import Image, UnidentifiedImageError
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 import requests
@@ -40,6 +52,9 @@ SUBSCRIPTION_MAPPING = settings.SUBSCRIPTION_MAPPING
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+PROFILE_IMAGE_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp') + (('image/heic',) if imaging.HEIF_SUPPORTED else ())
+PROFILE_IMAGE_UPLOAD_SALT = 'user.profile_image_upload'
+
 class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
@@ -59,42 +74,38 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             logger.warning("No image provided in request")
             return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
 
+        if len(user.profile_images) >= user.profile_images_remaining:
+            return Response({'error': 'Profile image limit reached. Please delete an existing image before adding a new one.'}, status=status.HTTP_400_BAD_REQUEST)
+
         image = request.FILES['profile_image']
-        
-        file_extension = image.name.split('.')[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
+        if image.size > settings.PROFILE_IMAGE_MAX_UPLOAD_SIZE:
+            return Response({'error': 'Image is too large'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            processed_image = process_profile_image(image)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            logger.warning(f"Invalid profile image uploaded for user {pk}: {e}")
+            return Response({'error': 'Invalid image file'}, status=status.HTTP_400_BAD_REQUEST)
+
+        unique_filename = f"{uuid.uuid4()}.jpg"
         
         try:
-            s3 = boto3.client('s3',
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
+            s3 = get_s3_client()
             
             bucket_name = settings.AWS_STORAGE_BUCKET_NAME
             s3_file_name = f'profile_images/{unique_filename}'
-            
-            content_type, _ = mimetypes.guess_type(image.name)
-            if content_type is None:
-                content_type = 'application/octet-stream'
 
             s3.upload_fileobj(
-                image,
+                processed_image,
                 bucket_name,
                 s3_file_name,
                 ExtraArgs={
-                    'ContentType': content_type
+                    'ContentType': 'image/jpeg'
                 }
             )
             
-            s3_url = f'https://{bucket_name}.s3.amazonaws.com/{s3_file_name}'
-            
-            if 'from_image_detail' in request.query_params:
-                s3_url += '?from_image_detail=true'
-            elif 'is_new_upload' in request.query_params:
-                s3_url += '?is_new_upload=true'
+            s3_url = profile_image_url(s3_file_name, request.query_params)
 
-            if len(user.profile_images) >= user.profile_images_remaining:
-                return Response({'error': 'Profile image limit reached. Please delete an existing image before adding a new one.'}, status=status.HTTP_400_BAD_REQUEST)
-            
             user.profile_images.append(s3_url)
             user.save()
 
@@ -104,6 +115,89 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             logger.error(f"Error uploading file to S3: {str(e)}")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=True, methods=['POST'])
+    def profile_image_upload_url(self, request, pk=None):
+        """Vydá presigned POST, kterým klient nahraje fotku přímo do S3 mimo naše servery."""
+        logger.info(f"Received profile_image_upload_url request for user {pk}")
+        user = self.get_object()
+        if user.pk != request.user.pk:
+            # Token i potvrzení musí patřit přihlášenému uživateli, jinak by šlo přepsat cizí fotku
+            logger.warning(f"User {request.user.pk} attempted a profile image upload for user {pk}")
+            return Response({'error': 'You can only upload your own profile images.'}, status=status.HTTP_403_FORBIDDEN)
+        if len(user.profile_images) >= user.profile_images_remaining:
+            return Response({'error': 'Profile image limit reached. Please delete an existing image before adding a new one.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = request.data.get('content_type', 'image/jpeg')
+        if content_type not in PROFILE_IMAGE_CONTENT_TYPES:
+            return Response({'error': f'Unsupported content type: {content_type}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        s3_file_name = f'profile_images/{uuid.uuid4()}'
+        try:
+            upload = get_s3_client().generate_presigned_post(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                Key=s3_file_name,
+                Fields={'Content-Type': content_type},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    ['content-length-range', 1, settings.PROFILE_IMAGE_MAX_UPLOAD_SIZE],
+                ],
+                ExpiresIn=settings.PROFILE_IMAGE_UPLOAD_URL_EXPIRY
+            )
+        except Exception as e:
+            logger.error(f"Error generating presigned upload for user {pk}: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # Podepsaný token váže klíč k uživateli, potvrdit ho tak nemůže nikdo jiný
+        upload_token = signing.dumps({'user': user.pk, 'key': s3_file_name}, salt=PROFILE_IMAGE_UPLOAD_SALT)
+        return Response({
+            'upload_url': upload['url'],
+            'fields': upload['fields'],
+            'upload_token': upload_token,
+            'max_size': settings.PROFILE_IMAGE_MAX_UPLOAD_SIZE,
+        })
+
+    @action(detail=True, methods=['POST'])
+    def confirm_profile_image_upload(self, request, pk=None):
+        logger.info(f"Received confirm_profile_image_upload request for user {pk}")
+        user = self.get_object()
+        if user.pk != request.user.pk:
+            logger.warning(f"User {request.user.pk} attempted a profile image upload for user {pk}")
+            return Response({'error': 'You can only upload your own profile images.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            payload = signing.loads(
+                request.data.get('upload_token', ''),
+                salt=PROFILE_IMAGE_UPLOAD_SALT,
+                max_age=settings.PROFILE_IMAGE_UPLOAD_URL_EXPIRY * 2
+            )
+        except signing.BadSignature:
+            return Response({'error': 'Invalid or expired upload token'}, status=status.HTTP_400_BAD_REQUEST)
+        if payload['user'] != user.pk:
+            return Response({'error': 'Invalid or expired upload token'}, status=status.HTTP_400_BAD_REQUEST)
+
+        s3_file_name = payload['key']
+        try:
+            head = get_s3_client().head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=s3_file_name)
+        except ClientError as e:
+            logger.warning(f"Uploaded profile image {s3_file_name} not found: {str(e)}")
+            return Response({'error': 'Uploaded image not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if head.get('ContentType') not in PROFILE_IMAGE_CONTENT_TYPES or head['ContentLength'] > settings.PROFILE_IMAGE_MAX_UPLOAD_SIZE:
+            return Response({'error': 'Invalid image file'}, status=status.HTTP_400_BAD_REQUEST)
+
+        s3_url = profile_image_url(s3_file_name, request.query_params)
+        with transaction.atomic():
+            user = CustomUser.objects.select_for_update().get(pk=user.pk)
+            if s3_url not in user.profile_images:
+                if len(user.profile_images) >= user.profile_images_remaining:
+                    return Response({'error': 'Profile image limit reached. Please delete an existing image before adding a new one.'}, status=status.HTTP_400_BAD_REQUEST)
+                user.profile_images.append(s3_url)
+                user.save()
+
+        # Normalizace (EXIF, rozlišení) proběhne na pozadí a přepíše objekt pod stejným klíčem
+        transaction.on_commit(lambda: ingest_profile_image.delay(user.pk, s3_file_name, s3_url))
+        logger.info(f"Profile image upload confirmed for user {pk}")
+        return Response({'message': 'Profile image uploaded successfully', 'image_url': s3_url})
+
     @action(detail=True, methods=['POST'])
     def add_profile_image(self, request, pk=None):
         logger.info(f"Received add_profile_image request for user {pk}")
@@ -120,6 +214,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         if image_url in user.profile_images:
             user.profile_images.remove(image_url)
             user.save()
+            result_cache.invalidate_human_image(image_url)
             logger.info(f"Profile image removed successfully for user {pk}")
             return Response({'message': 'Profile image removed successfully'})
         else:
@@ -163,14 +258,48 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 class FavoriteItemViewSet(viewsets.ModelViewSet):
     serializer_class = FavoriteItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = FavoriteCursorPagination
 
     def get_queryset(self):
-        return FavoriteItem.objects.filter(user=self.request.user)
+        # Produkt se načítá JOINem - počet dotazů nezávisí na počtu oblíbených
+        queryset = FavoriteItem.objects.filter(user=self.request.user).select_related('product')
+        product_fields = self._product_fields()
+        if product_fields:
+            only = model_field_names(Product, product_fields)
+            if 'image_url' in only:
+                only.append('mirrored_image_url')
+            queryset = queryset.only('id', 'created_at', 'product', *[f'product__{field}' for field in only])
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
             return FavoriteItemCreateSerializer
-        return FavoriteItemSerializer
+        product_fields = self._product_fields()
+        return favorite_item_serializer(product_fields) if product_fields else FavoriteItemSerializer
+
+    def _product_fields(self):
+        return requested_fields(self.request.query_params, ProductSerializer.Meta.fields, PRODUCT_COMPACT_FIELDS)
+
+    def perform_destroy(self, instance):
+        # Ne instance.delete() - změnový log i popularitu zapisuje delete_favorites
+        delete_favorites(instance.user_id, [instance.product_id])
+
+    def list(self, request, *args, **kwargs):
+        """
+        ETag z verze oblíbených uživatele (favorites_state, zvyšuje ji každé
+        přidání i odebrání) a z verze katalogu kvůli vnořeným produktům.
+        """
+        etag = catalog_etag(
+            get_catalog_state(), request.path, normalize_query(request.query_params),
+            str(request.user.pk), favorites_state(request.user.pk)
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -183,25 +312,56 @@ class FavoriteItemViewSet(viewsets.ModelViewSet):
         if not product_id or not user_id:
             return Response({"error": "Both product and user parameters are required."}, status=status.HTTP_400_BAD_REQUEST)
         
-        is_favorite = FavoriteItem.objects.filter(user_id=user_id, product_id=product_id).exists()
+        try:
+            is_favorite = contains(get_favorite_ids(int(user_id)), int(product_id))
+        except ValueError:
+            return Response({"error": "Product and user must be numeric ids."}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"is_favorite": is_favorite})
 
+    @action(detail=False, methods=['GET', 'POST'])
+    def check_bulk(self, request):
+        """
+        Které z produktů (?ids=1,2,3 nebo POST {"ids": [...]}) má přihlášený
+        uživatel v oblíbených - pro celou mřížku jedním dotazem.
+        """
+        raw_ids = request.query_params.get('ids', '') if request.method == 'GET' else request.data.get('ids', [])
+        try:
+            product_ids = parse_product_ids(raw_ids)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        favorites = favorite_product_ids(request.user.pk, product_ids)
+        return Response({"favorites": [product_id for product_id in product_ids if product_id in favorites]})
+
     @action(detail=False, methods=['POST'])
     def toggle(self, request):
         product_id = request.data.get('product')
         favorite, created = FavoriteItem.objects.get_or_create(user=request.user, product_id=product_id)
         
         if not created:
-            favorite.delete()
+            delete_favorites(request.user.pk, [favorite.product_id])
             return Response({"is_favorite": False}, status=status.HTTP_200_OK)
         else:
             return Response({"is_favorite": True}, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['POST'])
+    def sync(self, request):
+        """
+        Dávka offline změn z aplikace místo jednoho toggle na každé ťuknutí.
+        Vrací aktuální verzi a produkty změněné od verze klienta.
+        """
+        try:
+            client_version, wanted = parse_sync_request(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = sync_favorites(request.user.pk, client_version, wanted)
+        logger.info(f"Favorites sync for user {request.user.pk}: {len(wanted)} operations, version {client_version} -> {result['version']}")
+        return Response(result)
+
     @action(detail=False, methods=['GET'])
     def list_favorites(self, request):
-        favorites = self.get_queryset()
-        serializer = self.get_serializer(favorites, many=True)
-        return Response(serializer.data)
+        return self.list(request)
 
 @api_view(['POST'])
 def login(request):